@@ -0,0 +1,112 @@
+# ai-service/ann_index.py
+
+from pathlib import Path
+from typing import Optional
+import numpy as np
+
+# Índice IVF (inverted file) en NumPy puro: k-means esférico sobre los
+# embeddings normalizados y, por cada centroide, la lista de chunks asignados.
+# En consulta solo se puntúan las `nprobe` listas más cercanas, así que el
+# coste es ~ nlist + N * nprobe / nlist en vez de N.
+
+DEFAULT_NPROBE = 8
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Índices de los k mayores valores, ordenados de mayor a menor."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, list_ptr: np.ndarray, list_ids: np.ndarray):
+        self.centroids = centroids  # (nlist, d), normalizados
+        self.list_ptr = list_ptr    # (nlist + 1,) offsets dentro de list_ids
+        self.list_ids = list_ids    # (N,) ids de chunk agrupados por lista
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @property
+    def size(self) -> int:
+        return int(self.list_ids.shape[0])
+
+    @classmethod
+    def build(cls, embs: np.ndarray, nlist: Optional[int] = None, iters: int = 20,
+              seed: int = 0, max_train: int = 256) -> "IVFIndex":
+        """Entrena k-means esférico y reparte los vectores en listas.
+
+        `nlist` por defecto es ~sqrt(N); el entrenamiento usa como mucho
+        `max_train` puntos por centroide. Sin vectores devuelve un índice
+        vacío (sin listas), cuyas búsquedas no devuelven nada.
+        """
+        embs = np.asarray(embs, dtype=np.float32)
+        n = embs.shape[0]
+        if n == 0:
+            d = embs.shape[1] if embs.ndim == 2 else 0
+            return cls(np.zeros((0, d), np.float32), np.zeros(1, np.int64), np.zeros(0, np.int64))
+        if nlist is None:
+            nlist = int(np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+        rng = np.random.default_rng(seed)
+
+        train = embs
+        if n > nlist * max_train:
+            train = embs[rng.choice(n, nlist * max_train, replace=False)]
+        cents = train[rng.choice(train.shape[0], nlist, replace=False)].copy()
+
+        for _ in range(iters):
+            assign = np.argmax(train @ cents.T, axis=1)
+            counts = np.bincount(assign, minlength=nlist)
+            order = np.argsort(assign, kind='stable')
+            sums = np.zeros_like(cents)
+            nz = counts > 0
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nz]
+            sums[nz] = np.add.reduceat(train[order], starts, axis=0)
+            empty = counts == 0
+            if empty.any():
+                # re-siembra los clusters vacíos con puntos al azar
+                sums[empty] = train[rng.choice(train.shape[0], int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            cents = sums / np.maximum(norms, 1e-12)
+
+        assign = np.argmax(embs @ cents.T, axis=1) if n else np.empty(0, dtype=np.int64)
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=nlist)
+        ptr = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(counts, out=ptr[1:])
+        return cls(cents.astype(np.float32), ptr, order.astype(np.int64))
+
+    def candidates(self, qv: np.ndarray, nprobe: int) -> np.ndarray:
+        """Ids de los chunks en las `nprobe` listas más cercanas a `qv`."""
+        probe = _top(self.centroids @ qv, max(1, nprobe))
+        if len(probe) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.list_ids[self.list_ptr[c]:self.list_ptr[c + 1]] for c in probe])
+
+    def search(self, embs: np.ndarray, qv: np.ndarray, k: int, nprobe: int = DEFAULT_NPROBE):
+        """Devuelve (ids, scores) de los k mejores candidatos.
+
+        `nprobe` es el control recall/latencia: con nprobe >= nlist el
+        resultado es idéntico a la búsqueda exacta.
+        """
+        cand = self.candidates(qv, nprobe)
+        sims = embs[cand] @ qv
+        best = _top(sims, k)
+        return cand[best], sims[best]
+
+    def save(self, root: Path):
+        np.save(root / 'ann_centroids.npy', self.centroids)
+        np.save(root / 'ann_list_ptr.npy', self.list_ptr)
+        np.save(root / 'ann_list_ids.npy', self.list_ids)
+
+    @classmethod
+    def load(cls, root: Path) -> "IVFIndex":
+        """Abre el índice con mmap, como el resto del almacén (ver kb_store.py)."""
+        return cls(np.load(root / 'ann_centroids.npy', mmap_mode='r'),
+                   np.load(root / 'ann_list_ptr.npy', mmap_mode='r'),
+                   np.load(root / 'ann_list_ids.npy', mmap_mode='r'))
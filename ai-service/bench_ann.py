@@ -0,0 +1,72 @@
+# ai-service/bench_ann.py
+#
+# Compara la búsqueda exacta (embs @ qv + argsort) contra el índice IVF para
+# varios valores de nprobe: recall@k y latencia media por consulta.
+#
+#   python bench_ann.py                      # datos sintéticos (100k x 384)
+#   python bench_ann.py --n 500000 --k 6
+#   python bench_ann.py --kb kb_build/index.npz    # embeddings reales del KB
+
+import argparse
+import time
+import numpy as np
+from ann_index import IVFIndex
+
+
+def synthetic(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Mezcla de gaussianas normalizada, parecida a embeddings de texto."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    x = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def exact(embs: np.ndarray, qv: np.ndarray, k: int) -> np.ndarray:
+    return (embs @ qv).argsort()[::-1][:k]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--kb', help='ruta a kb_build/index.npz (si no, datos sintéticos)')
+    ap.add_argument('--n', type=int, default=100_000)
+    ap.add_argument('--dim', type=int, default=384)
+    ap.add_argument('--clusters', type=int, default=200)
+    ap.add_argument('--queries', type=int, default=200)
+    ap.add_argument('--k', type=int, default=6)
+    ap.add_argument('--nlist', type=int, default=None)
+    ap.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    args = ap.parse_args()
+
+    if args.kb:
+        embs = np.load(args.kb)['embs'].astype(np.float32)
+    else:
+        embs = synthetic(args.n, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    # consultas = chunks existentes con ruido, para que tengan vecinos reales
+    qs = embs[rng.integers(0, embs.shape[0], args.queries)]
+    qs = qs + 0.3 * rng.standard_normal(qs.shape).astype(np.float32) / np.sqrt(embs.shape[1])
+    qs = qs / np.linalg.norm(qs, axis=1, keepdims=True)
+
+    t0 = time.perf_counter()
+    index = IVFIndex.build(embs, nlist=args.nlist)
+    print(f'N={embs.shape[0]} dim={embs.shape[1]} nlist={index.nlist} '
+          f'build={time.perf_counter() - t0:.2f}s')
+
+    t0 = time.perf_counter()
+    truth = [set(exact(embs, q, args.k)) for q in qs]
+    t_exact = (time.perf_counter() - t0) / len(qs)
+    print(f'{"mode":>12} {"recall@" + str(args.k):>10} {"ms/query":>10} {"speedup":>8}')
+    print(f'{"exact":>12} {1.0:>10.3f} {t_exact * 1e3:>10.3f} {1.0:>8.1f}')
+
+    for nprobe in args.nprobe:
+        if nprobe > index.nlist:
+            break
+        t0 = time.perf_counter()
+        found = [index.search(embs, q, args.k, nprobe)[0] for q in qs]
+        t = (time.perf_counter() - t0) / len(qs)
+        recall = np.mean([len(truth[i] & set(f.tolist())) / args.k for i, f in enumerate(found)])
+        print(f'{"ivf/" + str(nprobe):>12} {recall:>10.3f} {t * 1e3:>10.3f} {t_exact / t:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# ai-service/bench_chat.py
+#
+# Per-turn latency of a simulated interview against a live Ollama, comparing:
+#   transcript: the whole <system>/<user>/<assistant> transcript re-sent as one
+#               prompt to /api/generate every turn (previous behaviour)
+#   chat:       structured messages to /api/chat (current behaviour); the
+#               prompt prefix is reused from the KV cache
+#
+#   OLLAMA_HOST=http://localhost:11434 python bench_chat.py --turns 20
+#
+# prompt_eval is what Ollama reports it actually evaluated: it grows every
+# turn in transcript mode and stays ~flat in chat mode.
+
+import argparse
+import time
+import requests
+from ollama_client import (
+    OLLAMA_CHAT_URL,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_READ_TIMEOUT,
+    OLLAMA_URL,
+)
+
+# calls Ollama directly (no scheduler/backends): one keep-alive connection
+# so every turn measures the model, not a new TCP handshake
+SESSION = requests.Session()
+
+SYSTEM = (
+    "Eres un entrevistador técnico para una vacante de Backend Developer "
+    "(Node.js). Haz una pregunta por turno y responde en una o dos frases."
+)
+ANSWERS = [
+    "Tengo cuatro años con Node.js y Express, sobre todo APIs REST.",
+    "Uso PostgreSQL; optimizo con índices, EXPLAIN ANALYZE y paginación por cursor.",
+    "Para idempotencia en pagos guardo una clave de idempotencia por petición.",
+    "Testeo con Jest y supertest, y contenedores de Postgres para integración.",
+    "Autentico con JWT de vida corta y refresh tokens rotados.",
+]
+
+
+def post(url, payload):
+    t0 = time.perf_counter()
+    r = SESSION.post(
+        url, json=payload, timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+    )
+    r.raise_for_status()
+    return r.json(), time.perf_counter() - t0
+
+
+def run(mode: str, model: str, turns: int, num_predict: int):
+    options = {"temperature": 0.2, "num_predict": num_predict}
+    history, rows = [], []
+    for t in range(turns):
+        user = ANSWERS[t % len(ANSWERS)]
+        if mode == "transcript":
+            prompt = [f"<system>{SYSTEM}</system>"]
+            for u, a in history:
+                prompt.append(f"<user>{u}</user>\n<assistant>{a}</assistant>")
+            prompt.append(f"<user>{user}</user>\n<assistant>")
+            data, wall = post(OLLAMA_URL, {"model": model, "prompt": "\n".join(prompt),
+                                           "stream": False, "options": options})
+            reply = data.get("response", "")
+        else:
+            messages = [{"role": "system", "content": SYSTEM}]
+            for u, a in history:
+                messages += [{"role": "user", "content": u}, {"role": "assistant", "content": a}]
+            messages.append({"role": "user", "content": user})
+            data, wall = post(OLLAMA_CHAT_URL, {"model": model, "messages": messages,
+                                                "stream": False, "options": options})
+            reply = data.get("message", {}).get("content", "")
+        history.append((user, reply))
+        rows.append((t + 1, wall, data.get("prompt_eval_count", 0),
+                     data.get("prompt_eval_duration", 0) / 1e6))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="llama3.2")
+    ap.add_argument("--turns", type=int, default=20)
+    ap.add_argument("--num-predict", type=int, default=48)
+    ap.add_argument("--modes", nargs="+", default=["transcript", "chat"])
+    args = ap.parse_args()
+
+    results = {m: run(m, args.model, args.turns, args.num_predict) for m in args.modes}
+    head = "".join(f"{m + ' wall ms':>20}{'prompt_eval':>13}{'eval ms':>9}" for m in args.modes)
+    print(f"{'turn':>4}{head}")
+    for i in range(args.turns):
+        cells = "".join(
+            f"{results[m][i][1] * 1e3:>20.0f}{results[m][i][2]:>13}{results[m][i][3]:>9.0f}"
+            for m in args.modes
+        )
+        print(f"{i + 1:>4}{cells}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# ai-service/bm25.py
+
+from pathlib import Path
+from typing import List, Optional
+import numpy as np, json, re, unicodedata
+
+# Índice léxico BM25 con postings dispersos en formato CSR:
+#   indptr[t]:indptr[t+1] delimita, dentro de doc_ids/weights, los chunks que
+#   contienen el término t. El peso BM25 de cada posting se precalcula al
+#   indexar, así que una consulta solo suma los postings de sus términos.
+
+K1, B = 1.2, 0.75
+STOPWORDS = set('''
+a al como con de del el en es la las lo los o para por que se su sus un una y
+the of and to in is for on with
+'''.split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sin tildes; conserva términos técnicos como node.js o c#."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return [t for t in re.findall(r'[a-z0-9]+(?:[.#+][a-z0-9]+)*[#+]*', text) if t not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, vocab: List[str], indptr: np.ndarray, doc_ids: np.ndarray, weights: np.ndarray, count: int):
+        self.vocab = {t: i for i, t in enumerate(vocab)}
+        self.indptr, self.doc_ids, self.weights, self.count = indptr, doc_ids, weights, count
+
+    @classmethod
+    def build(cls, texts: List[str]) -> 'BM25Index':
+        vocab, terms, docs, tfs, lens = {}, [], [], [], np.zeros(len(texts), dtype=np.float32)
+        for d, text in enumerate(texts):
+            toks = tokenize(text)
+            lens[d] = len(toks)
+            counts = {}
+            for t in toks: counts[t] = counts.get(t, 0) + 1
+            for t, tf in counts.items():
+                terms.append(vocab.setdefault(t, len(vocab))); docs.append(d); tfs.append(tf)
+        terms, docs = np.asarray(terms, dtype=np.int64), np.asarray(docs, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        df = np.bincount(terms, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        n, avgdl = len(texts), float(lens.mean()) if len(texts) else 1.0
+        idf = np.log(1 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = K1 * (1 - B + B * lens[docs] / max(avgdl, 1e-9))
+        weights = (idf[terms] * tfs * (K1 + 1) / (tfs + norm)).astype(np.float32)
+        return cls(list(vocab), indptr, docs, weights, n)
+
+    def scores(self, query: str, lo: int = 0, hi: Optional[int] = None):
+        """(ids, scores) de los chunks con algún término de la consulta.
+
+        Solo se recorren los postings de los términos de la consulta. Los
+        postings de cada término están ordenados por chunk, así que el rango
+        [lo, hi) se recorta con búsqueda binaria antes de puntuar.
+        """
+        ids, ws = [], []
+        for t in set(tokenize(query)):
+            i = self.vocab.get(t)
+            if i is None: continue
+            a, b = self.indptr[i], self.indptr[i + 1]
+            if lo > 0 or hi is not None:
+                post = self.doc_ids[a:b]
+                a, b = a + np.searchsorted(post, lo), a + np.searchsorted(post, self.count if hi is None else hi)
+            ids.append(self.doc_ids[a:b]); ws.append(self.weights[a:b])
+        if not ids: return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids, ws = np.concatenate(ids), np.concatenate(ws)
+        uniq, inv = np.unique(ids, return_inverse=True)
+        return uniq.astype(np.int64), np.bincount(inv, weights=ws).astype(np.float32)
+
+    def top(self, query: str, k: int, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+        ids, s = self.scores(query, lo, hi)
+        if len(ids) > k:
+            part = np.argpartition(-s, k - 1)[:k]
+            ids, s = ids[part], s[part]
+        return ids[np.argsort(-s, kind='stable')]
+
+    def save(self, root: Path):
+        np.save(root / 'bm25_indptr.npy', self.indptr)
+        np.save(root / 'bm25_docs.npy', self.doc_ids)
+        np.save(root / 'bm25_weights.npy', self.weights)
+        (root / 'bm25_vocab.json').write_text(json.dumps(list(self.vocab), ensure_ascii=False), encoding='utf-8')
+
+    @classmethod
+    def load(cls, root: Path, count: int) -> 'BM25Index':
+        vocab = json.loads((root / 'bm25_vocab.json').read_text(encoding='utf-8'))
+        return cls(vocab, np.load(root / 'bm25_indptr.npy', mmap_mode='r'),
+                   np.load(root / 'bm25_docs.npy', mmap_mode='r'),
+                   np.load(root / 'bm25_weights.npy', mmap_mode='r'), count)
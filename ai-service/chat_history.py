@@ -0,0 +1,132 @@
+# ai-service/chat_history.py
+
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List
+
+from chunking import count_tokens, split_long
+from llm_scheduler import llm_priority
+
+logger = logging.getLogger(__name__)
+
+# History compaction for long interviews:
+#   - the last CHAT_KEEP_TURNS turns are always sent verbatim;
+#   - older turns are folded into session["summary"] by a background LLM
+#     call between turns, CHAT_FOLD_BATCH turns at a time (each fold changes
+#     the prompt prefix, so batching keeps Ollama's KV cache useful);
+#   - CHAT_MAX_PROMPT_TOKENS is a hard ceiling: if the summary lags behind,
+#     the oldest verbatim turns are dropped to stay under it, and a new
+#     message that doesn't fit even without history is truncated (or
+#     rejected with PromptTooLong if the system prompt alone is too long).
+CHAT_KEEP_TURNS = int(os.getenv("CHAT_KEEP_TURNS", 6))
+CHAT_FOLD_BATCH = int(os.getenv("CHAT_FOLD_BATCH", 4))
+CHAT_MAX_PROMPT_TOKENS = int(os.getenv("CHAT_MAX_PROMPT_TOKENS", 3000))
+CHAT_SUMMARY_WORDS = int(os.getenv("CHAT_SUMMARY_WORDS", 150))
+
+START_TEXT = "Inicia la conversación con un saludo breve."
+
+_pending: Dict[str, asyncio.Task] = {}  # sid -> running compaction (keeps a reference)
+STATS = {"compactions": 0, "compaction_errors": 0, "turns_dropped": 0, "inputs_truncated": 0}
+
+
+class PromptTooLong(ValueError):
+    pass
+
+
+def _turn(u: str, a: str) -> List[Dict]:
+    return [
+        {"role": "user", "content": START_TEXT if u == "[start]" else u},
+        {"role": "assistant", "content": a},
+    ]
+
+
+def build_messages(session: Dict, text: str) -> List[Dict]:
+    """Chat messages for /api/chat: system, summary, recent turns, new user text.
+
+    Built the same way every turn, so until the next fold consecutive turns
+    share an identical prefix and Ollama reuses its KV cache for it.
+    """
+    head = [{"role": "system", "content": session["system"]}] if session["system"] else []
+    if session.get("summary"):
+        head.append({"role": "system", "content": f"Resumen de la entrevista hasta ahora:\n{session['summary']}"})
+    start = session.get("summarized", 0)
+    turns = [_turn(u, a) for u, a in session["history"][start:]]
+
+    room = CHAT_MAX_PROMPT_TOKENS - sum(count_tokens(m["content"]) for m in head)
+    if room <= 0:
+        raise PromptTooLong(f"system prompt exceeds CHAT_MAX_PROMPT_TOKENS ({CHAT_MAX_PROMPT_TOKENS})")
+    if count_tokens(text) > room:
+        text = split_long(text, room)[0]
+        STATS["inputs_truncated"] += 1
+    new = {"role": "user", "content": text}
+
+    budget = room - count_tokens(text)
+    used = sum(count_tokens(m["content"]) for t in turns for m in t)
+    dropped = 0
+    while turns and used > budget:
+        used -= sum(count_tokens(m["content"]) for m in turns.pop(0))
+        dropped += 1
+    # the same old turns are dropped again every turn until they are folded:
+    # count each one once (session["dropped_to"] is the furthest turn dropped)
+    if start + dropped > session.get("dropped_to", 0):
+        STATS["turns_dropped"] += start + dropped - max(start, session.get("dropped_to", 0))
+        session["dropped_to"] = start + dropped
+    return head + [m for t in turns for m in t] + [new]
+
+
+def needs_compaction(session: Dict) -> bool:
+    foldable = len(session["history"]) - session.get("summarized", 0) - CHAT_KEEP_TURNS
+    return foldable >= CHAT_FOLD_BATCH
+
+
+def _summary_prompt(summary: str, turns: List) -> str:
+    lines = "\n".join(
+        f"Candidato: {u}\nEntrevistador: {a}" for u, a in turns if u != "[start]"
+    )
+    return f"""
+    Resume la siguiente parte de una entrevista de trabajo en un máximo de {CHAT_SUMMARY_WORDS} palabras.
+    Conserva: preguntas ya hechas, respuestas y datos concretos del candidato, y puntos débiles detectados.
+    No inventes nada. Devuelve solo el resumen.
+
+    RESUMEN PREVIO:
+    {summary or "(ninguno)"}
+
+    NUEVOS TURNOS:
+    {lines}
+    """
+
+
+async def compact(sid: str, store, llm: Callable[[str, str], Awaitable[str]], model: str):
+    """Fold the oldest non-verbatim turns of a session into its summary."""
+    try:
+        session = await store.aget(sid)
+        if session is None or not needs_compaction(session):
+            return
+        start = session.get("summarized", 0)
+        end = len(session["history"]) - CHAT_KEEP_TURNS
+        with llm_priority("batch"):  # never delays a candidate's turn
+            summary = await llm(_summary_prompt(session.get("summary", ""), session["history"][start:end]), model)
+
+        # turns added meanwhile are kept: fold() only touches the summary, and
+        # a turn writing back its older copy of the session doesn't undo it
+        if not await store.afold(sid, start, end, summary.strip()):
+            return
+        STATS["compactions"] += 1
+        logger.info(f"Compacted session {sid}: {end} turns summarized")
+    except Exception as e:
+        STATS["compaction_errors"] += 1
+        logger.warning(f"History compaction failed for {sid}: {e}")
+    finally:
+        _pending.pop(sid, None)
+
+
+def schedule_compaction(sid: str, session: Dict, store, llm, model: str):
+    """Start compact() in the background if the session needs it (once per session)."""
+    if sid in _pending or not needs_compaction(session):
+        return
+    _pending[sid] = asyncio.get_running_loop().create_task(compact(sid, store, llm, model))
+
+
+def stats() -> Dict:
+    return {**STATS, "pending": len(_pending)}
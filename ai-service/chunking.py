@@ -0,0 +1,103 @@
+# ai-service/chunking.py
+
+from typing import List, Tuple
+import math, re
+
+# Chunker para el KB en markdown:
+#   - no corta palabras, frases ni encabezados;
+#   - cada chunk empieza con la ruta de encabezados de su sección;
+#   - se llena hasta `max_tokens` y arrastra `overlap` tokens (frases
+#     completas) del chunk anterior dentro de la misma sección;
+#   - secciones pequeñas consecutivas se agrupan si caben enteras.
+# Los tokens se estiman sin tokenizer (palabras y signos * TOKEN_RATIO), que
+# para español se acerca a lo que cuenta llama; basta para presupuestar prompts.
+
+TOKEN_RATIO = 1.3
+HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+SENTENCE = re.compile(r'(?<=[.!?…])\s+(?=[¿¡"«(\w])')
+
+
+def count_tokens(text: str) -> int:
+    return math.ceil(len(re.findall(r'\w+|[^\w\s]', text)) * TOKEN_RATIO)
+
+
+def sections(text: str) -> List[Tuple[List[str], List[str]]]:
+    """[(ruta de encabezados, unidades)], unidades = frases o ítems de lista."""
+    out, path, units, para = [], [], [], []
+    lines = text.lstrip('\ufeff').splitlines()
+    # frontmatter YAML: una sección propia, línea a línea
+    if lines and lines[0].strip() == '---':
+        end = next((i for i, l in enumerate(lines[1:], 1) if l.strip() == '---'), None)
+        if end is not None:
+            out.append(([], [l.rstrip() for l in lines[:end + 1] if l.strip()]))
+            lines = lines[end + 1:]
+
+    def flush_para():
+        if para:
+            units.extend(s for s in SENTENCE.split(' '.join(para)) if s.strip())
+            para.clear()
+
+    for line in lines:
+        m = HEADING.match(line.strip())
+        if m:
+            flush_para()
+            if units: out.append((list(path), list(units))); units.clear()
+            level = len(m.group(1))
+            path = [h for h in path if len(h) - len(h.lstrip('#')) < level] + [line.strip()]
+        elif not line.strip():
+            flush_para()
+        elif re.match(r'\s*([-*+]|\d+[.)])\s', line):
+            flush_para(); units.append(line.rstrip())
+        else:
+            para.append(line.strip())
+    flush_para()
+    if units: out.append((list(path), list(units)))
+    return out
+
+
+def split_long(unit: str, budget: int) -> List[str]:
+    """Parte una unidad que no cabe sola, por palabras."""
+    words, out, cur = unit.split(), [], []
+    for w in words:
+        if cur and count_tokens(' '.join(cur + [w])) > budget:
+            out.append(' '.join(cur)); cur = []
+        cur.append(w)
+    if cur: out.append(' '.join(cur))
+    return out
+
+
+def chunk_markdown(text: str, max_tokens: int = 200, overlap: int = 40) -> List[str]:
+    chunks, cur, cur_tok = [], [], 0
+
+    def flush():
+        nonlocal cur, cur_tok
+        if cur: chunks.append('\n'.join(cur).strip())
+        cur, cur_tok = [], 0
+
+    for path, units in sections(text):
+        head = '\n'.join(path)
+        head_tok = count_tokens(head) if head else 0
+        sec_tok = head_tok + sum(count_tokens(u) for u in units)
+        if cur and cur_tok + sec_tok > max_tokens:
+            flush()
+        if head:
+            cur.append(head); cur_tok += head_tok
+        budget = max(max_tokens - head_tok, 1)
+        pieces = [p for u in units for p in (split_long(u, budget) if count_tokens(u) > budget else [u])]
+        body = []  # unidades de este chunk (sin encabezados), para el solape
+        for p in pieces:
+            t = count_tokens(p)
+            if body and cur_tok + t > max_tokens:
+                flush()
+                # el solape no puede empujar encabezado + solape + pieza por encima de max_tokens
+                room = min(overlap, max_tokens - head_tok - t)
+                carry, carry_tok = [], 0
+                for u in reversed(body):
+                    if carry_tok + count_tokens(u) > room: break
+                    carry.insert(0, u); carry_tok += count_tokens(u)
+                cur = ([head] if head else []) + carry
+                cur_tok = head_tok + carry_tok
+                body = list(carry)
+            cur.append(p); cur_tok += t; body.append(p)
+    flush()
+    return [c for c in chunks if c]
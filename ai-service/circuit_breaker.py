@@ -0,0 +1,129 @@
+# ai-service/circuit_breaker.py
+
+import os
+import math
+import time
+import logging
+from typing import Dict, Optional
+
+from llm_errors import LLMUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker for one Ollama backend:
+#   closed     calls go through; LLM_CB_FAILURES consecutive failures
+#              (connect errors, timeouts, 5xx) or LLM_CB_SLOW_CALLS
+#              consecutive slow calls (first byte of a stream after more than
+#              LLM_CB_SLOW_CALL s; a full generation's length isn't judged)
+#              open it;
+#   open       calls are refused at once instead of waiting for a stalled
+#              host; after LLM_CB_OPEN_SECONDS (doubling on each re-open, up
+#              to LLM_CB_OPEN_MAX) it becomes
+#   half_open  LLM_CB_HALF_OPEN_CALLS trial calls are let through: a good one
+#              closes the circuit, a bad one opens it again.
+# A successful health probe (ollama_backends) only moves an open circuit to
+# half_open early: a host can answer /api/tags while generation is stalled.
+LLM_CB_FAILURES = int(os.getenv("LLM_CB_FAILURES", 3))
+LLM_CB_SLOW_CALL = float(os.getenv("LLM_CB_SLOW_CALL", 60))
+LLM_CB_SLOW_CALLS = int(os.getenv("LLM_CB_SLOW_CALLS", 3))
+LLM_CB_OPEN_SECONDS = float(os.getenv("LLM_CB_OPEN_SECONDS", 15))
+LLM_CB_OPEN_MAX = float(os.getenv("LLM_CB_OPEN_MAX", 300))
+LLM_CB_HALF_OPEN_CALLS = int(os.getenv("LLM_CB_HALF_OPEN_CALLS", 1))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.failures = self.slow = 0  # consecutive, while closed
+        self.opens = 0                 # consecutive, drives the open time
+        self.open_until = 0.0
+        self.trials = 0                # half-open calls in flight
+        self.counts = {"opened": 0, "failures": 0, "slow_calls": 0}
+
+    def _refresh(self):
+        if self.state == OPEN and time.monotonic() >= self.open_until:
+            self.state, self.trials = HALF_OPEN, 0
+
+    def allow(self) -> bool:
+        self._refresh()
+        if self.state == HALF_OPEN:
+            return self.trials < LLM_CB_HALF_OPEN_CALLS
+        return self.state == CLOSED
+
+    def begin(self):
+        """A call is about to be made (call after allow())."""
+        self._refresh()
+        if self.state == HALF_OPEN:
+            self.trials += 1
+
+    def abandon(self):
+        """The call ended without telling anything about the backend."""
+        if self.state == HALF_OPEN and self.trials:
+            self.trials -= 1
+
+    def record(self, ok: bool, seconds: Optional[float]):
+        """Outcome of a call; `seconds` is its time to first byte, None if unknown."""
+        slow = ok and seconds is not None and seconds > LLM_CB_SLOW_CALL
+        self.counts["failures"] += not ok
+        self.counts["slow_calls"] += slow
+        if self.state == HALF_OPEN:
+            if ok and not slow:
+                self.reset()
+            else:
+                self.trip("trial call " + ("was slow" if ok else "failed"))
+            return
+        if self.state == OPEN:
+            return  # late result of a call started before the circuit opened
+        if not ok:
+            self.failures += 1
+            if self.failures >= LLM_CB_FAILURES:
+                self.trip(f"{self.failures} consecutive failures")
+        elif slow:
+            self.slow += 1
+            if self.slow >= LLM_CB_SLOW_CALLS:
+                self.trip(f"{self.slow} consecutive calls slower than {LLM_CB_SLOW_CALL:.0f}s")
+        else:
+            self.failures = self.slow = 0
+
+    def trip(self, reason: str):
+        seconds = min(LLM_CB_OPEN_MAX, LLM_CB_OPEN_SECONDS * 2**self.opens)
+        self.state = OPEN
+        self.opens += 1
+        self.open_until = time.monotonic() + seconds
+        self.failures = self.slow = self.trials = 0
+        self.counts["opened"] += 1
+        logger.warning(f"⚠️ Circuit open for {self.name} ({seconds:.0f}s): {reason}")
+
+    def probe_ok(self):
+        if self.state == OPEN:
+            self.state, self.trials = HALF_OPEN, 0
+
+    def reset(self):
+        if self.state != CLOSED:
+            logger.info(f"✅ Circuit closed for {self.name}")
+        self.state = CLOSED
+        self.failures = self.slow = self.opens = self.trials = 0
+        self.open_until = 0.0
+
+    def retry_after(self) -> int:
+        self._refresh()
+        if self.state != OPEN:
+            return 1
+        return max(1, math.ceil(self.open_until - time.monotonic()))
+
+    def stats(self) -> Dict:
+        self._refresh()
+        return {
+            "state": self.state,
+            "open_for": max(0.0, round(self.open_until - time.monotonic(), 1)),
+            "consecutive_failures": self.failures,
+            "consecutive_slow": self.slow,
+            **self.counts,
+        }
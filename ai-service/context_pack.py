@@ -0,0 +1,33 @@
+# ai-service/context_pack.py
+
+from typing import Dict, List, Tuple
+from chunking import count_tokens
+import numpy as np
+
+# Empaqueta los chunks recuperados en un presupuesto fijo de tokens antes de
+# construir el prompt: el tiempo de evaluación del prompt en Ollama (CPU) crece
+# con su longitud, así que acotarlo acota la latencia.
+
+
+def pack_context(hits: List[Dict], vectors: np.ndarray, budget: int,
+                 dup_threshold: float = 0.92, sep: str = '\n\n') -> Tuple[str, Dict]:
+    """Devuelve (contexto, stats).
+
+    `hits` viene en orden de relevancia y `vectors` son sus embeddings
+    normalizados (los mismos del índice, no se vuelve a codificar nada). Se
+    descartan los casi duplicados (coseno >= dup_threshold con alguno ya
+    elegido) y se añaden chunks en orden mientras quepan en `budget`.
+    """
+    kept, kept_vecs, used = [], [], 0
+    dups = over = 0
+    sep_tok = count_tokens(sep)
+    for d, v in zip(hits, vectors):
+        if kept_vecs and float(np.max(np.stack(kept_vecs) @ v)) >= dup_threshold:
+            dups += 1; continue
+        t = count_tokens(d['text']) + (sep_tok if kept else 0)
+        if used + t > budget:
+            over += 1; continue  # uno más corto de menor rango aún puede caber
+        kept.append(d); kept_vecs.append(v); used += t
+    stats = {'tokens': used, 'budget': budget, 'chunks': len(kept),
+             'dropped_duplicates': dups, 'dropped_over_budget': over}
+    return sep.join(d['text'] for d in kept), stats
@@ -0,0 +1,88 @@
+# ai-service/json_stream.py
+
+import json
+from typing import Dict, List, Optional
+
+
+class ArrayItemStream:
+    """Incremental parser for the objects of one array inside a streamed JSON.
+
+    Feed it the model output as it arrives; `feed` returns the elements of
+    the top-level `key` array (e.g. "questions") that were completed by that
+    chunk, already json-decoded. Only string/escape state and bracket depth
+    are tracked, so each character is scanned once and nothing is re-parsed.
+    Anything before the first "{" (prose the model may add) is ignored.
+    """
+
+    def __init__(self, key: str = "questions"):
+        self.key = key
+        self.text = ""           # everything fed so far
+        self._pos = 0            # next character to scan
+        self._stack: List[str] = []
+        self._in_str = self._esc = False
+        self._str_start = 0
+        self._last_str: Optional[str] = None
+        self._cur_key: Optional[str] = None
+        self._array_depth: Optional[int] = None  # stack depth inside the target array
+        self._item_start: Optional[int] = None
+        self.count = 0           # items returned so far
+        self.array_closed = False
+        self.closed = False      # the top-level object is complete
+
+    def feed(self, chunk: str) -> List:
+        self.text += chunk
+        items = []
+        text, stack = self.text, self._stack
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    if len(stack) == 1:  # only keys of the top-level object matter
+                        self._last_str = text[self._str_start:i]
+                continue
+            if not stack and ch != "{":
+                continue
+            if ch == '"':
+                self._in_str, self._str_start = True, i + 1
+            elif ch == ":" and len(stack) == 1:
+                self._cur_key = self._last_str
+            elif ch == "," and len(stack) == 1:
+                self._cur_key = None
+            elif ch in "{[":
+                if (
+                    ch == "{"
+                    and self._array_depth is not None
+                    and len(stack) == self._array_depth
+                ):
+                    self._item_start = i
+                stack.append(ch)
+                if ch == "[" and len(stack) == 2 and self._cur_key == self.key:
+                    self._array_depth = 2
+            elif ch in "}]":
+                if not stack or stack[-1] != ("{" if ch == "}" else "["):
+                    raise ValueError(f"Unbalanced {ch!r} at offset {i}")
+                stack.pop()
+                if self._item_start is not None and len(stack) == self._array_depth:
+                    items.append(json.loads(text[self._item_start:i + 1]))
+                    self._item_start = None
+                elif ch == "]" and self._array_depth is not None and len(stack) == 1:
+                    self.array_closed = True
+                    self._array_depth = None
+                if not stack:
+                    self.closed = True
+        self._pos = len(text)
+        self.count += len(items)
+        return items
+
+    def document(self) -> Dict:
+        """The complete top-level object (after the stream has ended)."""
+        start = self.text.find("{")
+        end = self.text.rfind("}") + 1
+        if start < 0 or end <= start:
+            raise ValueError("No JSON found in response")
+        return json.loads(self.text[start:end])
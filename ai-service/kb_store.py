@@ -0,0 +1,168 @@
+# ai-service/kb_store.py
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from bm25 import BM25Index
+from ann_index import IVFIndex
+import numpy as np, json, os, re, shutil, hashlib
+
+# Almacén del KB pensado para servir desde disco:
+#   embs.npy     (N, d) float32 | float16 | int8, abierto con mmap
+#   scales.npy   (N,) float32, escala por vector (solo int8)
+#   offsets.npy  (N + 1,) int64, offsets de cada chunk dentro de text.bin
+#   text.bin     textos UTF-8 concatenados; solo se leen los k resultados
+#   chunks.npy   (N, 2) int32: [id de fuente, nº de chunk dentro de la fuente]
+#   meta.json    dtype, dim, count, version, la lista de fuentes y el rango
+#                de filas [lo, hi) de cada colección (kb/<colección>/...)
+#   bm25_*       índice léxico (ver bm25.py)
+#   ann_*        índice IVF de esta misma versión (ver ann_index.py)
+# Todo se abre con mmap, así que varios workers de uvicorn comparten las mismas
+# páginas a través del page cache y la memoria residente no crece con el KB.
+# Cada versión vive en su propio directorio y `kb_store` es un symlink que se
+# cambia con os.replace (atómico); publish_dir lo hace para cualquier conjunto
+# de ficheros que deba verse entero o no verse (también la caché del build).
+
+DTYPES = ('float32', 'float16', 'int8')
+BLOCK = 16384  # filas por bloque al puntuar: acota la memoria temporal
+
+
+def store_version(hashes: List[str], dtype: str) -> str:
+    """Versión del almacén: `hashes` debe cubrir todo lo que se guarda de cada chunk."""
+    h = hashlib.sha256(dtype.encode())
+    for x in hashes: h.update(x.encode())
+    return h.hexdigest()[:12]
+
+
+def linked_version(path: str = 'kb_store') -> Optional[str]:
+    """Versión publicada ahora en `path` (el sufijo de su symlink), None si no hay almacén."""
+    try:
+        return os.readlink(path).rsplit('.', 1)[-1]
+    except OSError:
+        return None
+
+
+def quantize(embs: np.ndarray, dtype: str):
+    """Devuelve (embs en `dtype`, escalas o None)."""
+    if dtype not in DTYPES: raise ValueError(f'dtype no soportado: {dtype}')
+    embs = np.asarray(embs, dtype=np.float32)
+    if dtype == 'int8':
+        scales = np.abs(embs).max(axis=1) / 127.0 if len(embs) else np.zeros(0, np.float32)
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        return np.round(embs / scales[:, None]).astype(np.int8), scales
+    return embs.astype(dtype), None
+
+
+def publish_dir(path: str, version: str, fill: Callable[[Path], None]):
+    """Publica una versión como unidad: `fill(tmp)` escribe el directorio, que se
+    renombra a `<path>.<version>`, y el symlink `path` se cambia a él con os.replace.
+
+    `version` identifica el contenido: si ese directorio ya existe se reutiliza
+    tal cual (puede haber lectores dentro) y `fill` no se llama.
+    """
+    link = Path(path)
+    target = link.with_name(f'{link.name}.{version}')
+    if not target.is_dir():
+        tmp = link.with_name(f'{link.name}.{version}.tmp.{os.getpid()}')
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        fill(tmp)
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            if not target.is_dir(): raise
+            shutil.rmtree(tmp, ignore_errors=True)  # otro proceso publicó la misma versión
+    previous = os.readlink(link) if link.is_symlink() else None
+    tmp_link = link.with_name(f'{link.name}.link.{os.getpid()}')
+    if tmp_link.is_symlink() or tmp_link.exists(): tmp_link.unlink()
+    os.symlink(target.name, tmp_link)
+    os.replace(tmp_link, link)
+    # versiones antiguas: se conservan la actual y la anterior (un lector puede
+    # acabar de resolverla); las más viejas se borran y quien aún las tenga
+    # mapeadas sigue leyéndolas. Los temporales de otros procesos no se tocan.
+    version_dir = re.compile(rf'{re.escape(link.name)}\.[0-9a-f]+')
+    for old in link.parent.glob(f'{link.name}.*'):
+        if old.is_symlink() or not old.is_dir() or old.name in (target.name, previous): continue
+        if version_dir.fullmatch(old.name) or old.name.endswith(f'.tmp.{os.getpid()}'):
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def write_store(path: str, embs: np.ndarray, docs: List[Dict], version: str, dtype: str = 'float16'):
+    """Escribe una nueva versión del almacén y cambia el symlink `path` a ella."""
+    def fill(tmp: Path):
+        q, scales = quantize(embs, dtype)
+        np.save(tmp / 'embs.npy', q)
+        if scales is not None: np.save(tmp / 'scales.npy', scales)
+
+        sources, src_ids, rows, offsets, collections = [], {}, [], [0], {}
+        with open(tmp / 'text.bin', 'wb') as f:
+            for r, d in enumerate(docs):
+                col = d.get('collection', '')
+                if col in collections and collections[col][1] != r:
+                    raise ValueError(f'colección no contigua: {col!r} (ordena los docs por colección)')
+                collections[col] = [collections.get(col, [r])[0], r + 1]
+                b = d['text'].encode('utf-8')
+                f.write(b)
+                offsets.append(offsets[-1] + len(b))
+                if d['source'] not in src_ids:
+                    src_ids[d['source']] = len(sources); sources.append(d['source'])
+                rows.append((src_ids[d['source']], d['i']))
+        np.save(tmp / 'offsets.npy', np.asarray(offsets, dtype=np.int64))
+        np.save(tmp / 'chunks.npy', np.asarray(rows, dtype=np.int32).reshape(-1, 2))
+        BM25Index.build([d['text'] for d in docs]).save(tmp)
+        if len(docs): IVFIndex.build(embs).save(tmp)
+        meta = {'version': version, 'dtype': dtype, 'count': len(docs),
+                'dim': int(q.shape[1]) if q.ndim == 2 else 0, 'sources': sources,
+                'collections': collections}
+        (tmp / 'meta.json').write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+    publish_dir(path, version, fill)
+
+
+class KBStore:
+    def __init__(self, path: str = 'kb_store'):
+        root = Path(path).resolve()  # fija la versión actual aunque el symlink cambie
+        self.meta = json.loads((root / 'meta.json').read_text(encoding='utf-8'))
+        self.version, self.dtype, self.count = self.meta['version'], self.meta['dtype'], self.meta['count']
+        self.sources: List[str] = self.meta['sources']
+        self.collections: Dict[str, Tuple[int, int]] = {c: tuple(r) for c, r in self.meta.get('collections', {}).items()}
+        self.embs = np.load(root / 'embs.npy', mmap_mode='r')
+        self.scales = np.load(root / 'scales.npy', mmap_mode='r') if self.dtype == 'int8' else None
+        self.offsets = np.load(root / 'offsets.npy', mmap_mode='r')
+        self.chunks = np.load(root / 'chunks.npy', mmap_mode='r')
+        size = (root / 'text.bin').stat().st_size
+        self.text = np.memmap(root / 'text.bin', dtype=np.uint8, mode='r') if size else np.zeros(0, np.uint8)
+        self.bm25 = BM25Index.load(root, self.count) if (root / 'bm25_vocab.json').exists() else None
+        self.ann = IVFIndex.load(root) if (root / 'ann_list_ids.npy').exists() else None
+
+    def __len__(self): return self.count
+
+    def vectors(self, ids) -> np.ndarray:
+        """Embeddings float32 (des-cuantizados) de las filas `ids`."""
+        v = np.asarray(self.embs[ids], dtype=np.float32)
+        if self.scales is not None: v *= np.asarray(self.scales[ids])[:, None]
+        return v
+
+    def scores(self, qvs: np.ndarray, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+        """Similitud coseno (n_consultas, hi - lo) recorriendo el mmap por bloques."""
+        hi = self.count if hi is None else hi
+        out = np.empty((qvs.shape[0], hi - lo), dtype=np.float32)
+        for a in range(lo, hi, BLOCK):
+            b = min(a + BLOCK, hi)
+            block = self.embs[a:b]
+            s = qvs @ (block.T if self.dtype == 'float32' else np.asarray(block, dtype=np.float32).T)
+            if self.scales is not None: s *= np.asarray(self.scales[a:b])
+            out[:, a - lo:b - lo] = s
+        return out
+
+    def rows(self, collection: Optional[str] = None) -> Tuple[int, int]:
+        """Rango [lo, hi) de filas de una colección (todo el almacén si es None)."""
+        if collection is None: return 0, self.count
+        return self.collections.get(collection, (0, 0))
+
+    def collection_of(self, i: int) -> str:
+        return next((c for c, (lo, hi) in self.collections.items() if lo <= i < hi), '')
+
+    def doc(self, i: int) -> Dict:
+        a, b = int(self.offsets[i]), int(self.offsets[i + 1])
+        src, n = self.chunks[i]
+        return {'text': bytes(self.text[a:b]).decode('utf-8'), 'source': self.sources[src], 'i': int(n),
+                'id': int(i), 'collection': self.collection_of(i)}
@@ -0,0 +1,9 @@
+# ai-service/llm_errors.py
+
+
+class LLMUnavailable(Exception):
+    """The LLM can't take this call right now (main.py answers 503 + Retry-After)."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,176 @@
+# ai-service/llm_scheduler.py
+
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional
+
+from llm_errors import LLMUnavailable
+from ollama_backends import OLLAMA_HOSTS
+
+logger = logging.getLogger(__name__)
+
+# Admission control for every async Ollama call (see ollama_client._apost /
+# _astream). Two queues:
+#   interactive  candidate-facing chat turns (default)
+#   batch        exam/interview generation, their fix-ups, history compaction
+# At most LLM_MAX_CONCURRENCY calls run at once; LLM_INTERACTIVE_RESERVED of
+# those slots are never given to batch work, so a burst of exam generations
+# can't make chat turns wait for a full generation. Free slots are shared by
+# smooth weighted round robin (LLM_*_WEIGHT), so batch work is slowed down,
+# not starved. A full queue rejects the call with QueueFull (503 +
+# Retry-After in main.py) instead of letting latency grow without bound.
+PRIORITIES = ("interactive", "batch")
+# default: 4 per Ollama backend (Ollama's own OLLAMA_NUM_PARALLEL default).
+# OLLAMA_MAX_CONCURRENCY is the deprecated name from before the scheduler.
+LLM_MAX_CONCURRENCY = int(
+    os.getenv("LLM_MAX_CONCURRENCY")
+    or os.getenv("OLLAMA_MAX_CONCURRENCY")
+    or 4 * len(OLLAMA_HOSTS)
+)
+if os.getenv("OLLAMA_MAX_CONCURRENCY") and not os.getenv("LLM_MAX_CONCURRENCY"):
+    logger.warning("OLLAMA_MAX_CONCURRENCY is deprecated, use LLM_MAX_CONCURRENCY")
+LLM_INTERACTIVE_RESERVED = int(os.getenv("LLM_INTERACTIVE_RESERVED", 1))
+LLM_WEIGHTS = {
+    "interactive": int(os.getenv("LLM_INTERACTIVE_WEIGHT", 4)),
+    "batch": int(os.getenv("LLM_BATCH_WEIGHT", 1)),
+}
+LLM_QUEUE_MAX = {
+    "interactive": int(os.getenv("LLM_QUEUE_MAX_INTERACTIVE", 64)),
+    "batch": int(os.getenv("LLM_QUEUE_MAX_BATCH", 16)),
+}
+
+_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+
+@contextmanager
+def llm_priority(name: str):
+    """Run the LLM calls made inside this block (and tasks it creates) at `name`."""
+    if name not in PRIORITIES:
+        raise ValueError(f"unknown priority: {name}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class QueueFull(LLMUnavailable):
+    def __init__(self, priority: str, retry_after: int):
+        super().__init__(f"LLM {priority} queue is full, retry in {retry_after}s", retry_after)
+        self.priority = priority
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 reserved: int = LLM_INTERACTIVE_RESERVED,
+                 weights: Dict[str, int] = LLM_WEIGHTS,
+                 queue_max: Dict[str, int] = LLM_QUEUE_MAX):
+        self.max_concurrency = max(1, max_concurrency)
+        self.reserved = min(max(0, reserved), self.max_concurrency - 1)
+        self.weights, self.queue_max = dict(weights), dict(queue_max)
+        self._queues: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in PRIORITIES}
+        self._active = {p: 0 for p in PRIORITIES}
+        self._credit = {p: 0 for p in PRIORITIES}
+        self.admitted = {p: 0 for p in PRIORITIES}
+        self.rejected = {p: 0 for p in PRIORITIES}
+        self._waits = {p: deque(maxlen=1000) for p in PRIORITIES}  # seconds
+        self._service: Deque[float] = deque(maxlen=200)  # seconds holding a slot
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None):
+        """Hold one Ollama slot for the duration of the block."""
+        p = priority or _priority.get()
+        await self._acquire(p)
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service.append(time.monotonic() - t0)
+            self._release(p)
+
+    def _can_run(self, p: str) -> bool:
+        if sum(self._active.values()) >= self.max_concurrency:
+            return False
+        return p == "interactive" or self._active[p] < self.max_concurrency - self.reserved
+
+    async def _acquire(self, p: str):
+        t0 = time.monotonic()
+        queue = self._queues[p]
+        if not queue and self._can_run(p):
+            self._active[p] += 1
+        else:
+            if len(queue) >= self.queue_max[p]:
+                self.rejected[p] += 1
+                raise QueueFull(p, self.retry_after(p))
+            fut = asyncio.get_running_loop().create_future()
+            queue.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._release(p)  # granted just before the cancel: hand it on
+                elif fut in queue:
+                    queue.remove(fut)
+                raise
+        self.admitted[p] += 1
+        self._waits[p].append(time.monotonic() - t0)
+
+    def _release(self, p: str):
+        self._active[p] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while True:
+            for q in self._queues.values():
+                while q and q[0].done():  # cancelled waiters
+                    q.popleft()
+            ready = [p for p in PRIORITIES if self._queues[p] and self._can_run(p)]
+            if not ready:
+                return
+            # smooth weighted round robin over the queues that can run now
+            total = sum(self.weights[p] for p in ready)
+            for p in ready:
+                self._credit[p] += self.weights[p]
+            p = max(ready, key=lambda x: self._credit[x])
+            self._credit[p] -= total
+            self._active[p] += 1
+            self._queues[p].popleft().set_result(None)
+
+    def idle(self) -> bool:
+        """No call running or waiting (used to schedule background work)."""
+        return not any(self._active.values()) and not any(self._queues.values())
+
+    def retry_after(self, p: str) -> int:
+        """Seconds until a rejected caller has a reasonable chance to get in."""
+        service = sum(self._service) / len(self._service) if self._service else 5.0
+        slots = self.max_concurrency - (self.reserved if p == "batch" else 0)
+        return int(min(60, max(1, math.ceil(len(self._queues[p]) * service / slots))))
+
+    def stats(self) -> Dict:
+        def wait_ms(p):
+            w = sorted(self._waits[p])
+            if not w:
+                return {"avg": 0.0, "p95": 0.0}
+            return {
+                "avg": round(sum(w) / len(w) * 1e3, 1),
+                "p95": round(w[min(len(w) - 1, int(len(w) * 0.95))] * 1e3, 1),
+            }
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "interactive_reserved": self.reserved,
+            "active": dict(self._active),
+            "queued": {p: len(q) for p, q in self._queues.items()},
+            "admitted": dict(self.admitted),
+            "rejected": dict(self.rejected),
+            "wait_ms": {p: wait_ms(p) for p in PRIORITIES},
+        }
+
+
+SCHEDULER = LLMScheduler()
@@ -1,15 +1,49 @@
 ﻿from validate_exam import validate_exam
 from rag_retrieve import Retriever
-from ollama_client import chat_once
-from fastapi import FastAPI, HTTPException  # type: ignore
+from kb_store import linked_version
+from ollama_client import (
+    achat,
+    achat_once,
+    astream_chat,
+    astream_once,
+    alist_models,
+    aclose_client,
+    get_async_client,
+)
+from ollama_client import stats as ollama_client_stats
+from ollama_backends import BACKENDS
+from reindex_jobs import ReindexJobs
+from context_pack import pack_context
+from session_store import make_session_store
+from chat_history import START_TEXT, PromptTooLong, build_messages, schedule_compaction
+from chat_history import stats as chat_history_stats
+from schemas import (
+    exam_question_schema,
+    exam_schema,
+    interview_question_schema,
+    interview_schema,
+    ollama_format,
+    questions_schema,
+)
+from json_stream import ArrayItemStream
+from result_cache import ResultCache, cache_key
+from singleflight import SingleFlight
+from llm_scheduler import SCHEDULER, llm_priority
+from llm_errors import LLMUnavailable
+from question_pool import QUESTION_POOL, QuestionPool, kb_targets, role_key
+from question_dedup import QUESTION_DEDUP, dedup_questions
+from question_dedup import stats as question_dedup_stats
+from fastapi import FastAPI, HTTPException, Request  # type: ignore
+from fastapi.responses import JSONResponse, StreamingResponse  # type: ignore
 from fastapi.middleware.cors import CORSMiddleware  # type: ignore
+from starlette.concurrency import run_in_threadpool  # type: ignore
 from pydantic import BaseModel  # type: ignore
 from typing import Dict, List, Tuple, Optional
 from uuid import uuid4
-import subprocess
-import sys
 import json
 import logging
+import os
+import threading
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -37,13 +71,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-SESSIONS: Dict[str, Dict] = {}
+SESSIONS = make_session_store()
 
 
 # Use a model that should be available
 DEFAULT_CHAT_MODEL = "llama3.2"
 DEFAULT_EXAM_MODEL = "llama3.2"
 
+# Chunks per KB collection (kb/<collection>/) packed into the exam context
+EXAM_CONTEXT_MIX = {"banco_preguntas": 3, "rubricas": 2, "vacantes": 1}
+# Token budget for that context; bounds prompt-eval time on the Ollama host
+EXAM_CONTEXT_TOKENS = int(os.getenv("EXAM_CONTEXT_TOKENS", 1200))
+EXAM_CONTEXT_DUP_THRESHOLD = float(os.getenv("EXAM_CONTEXT_DUP_THRESHOLD", 0.92))
+
+# How often generation needs the second "fix the JSON" LLM call despite the
+# schema-constrained output (see schemas.py); exposed under /stats
+GENERATION_STATS = {
+    kind: {"calls": 0, "repairs": 0, "repair_failures": 0}
+    for kind in ("exam", "interview")
+}
+GENERATION_STATS["interview"].update({"streams": 0, "streams_cancelled": 0})
+
+# Successful generations, keyed by request (+ KB version); see result_cache.py
+GENERATION_CACHE = ResultCache()
+# Identical generations already running are awaited instead of repeated
+GENERATION_INFLIGHT = SingleFlight()
+
+# Pre-generated questions served before falling back to live generation
+POOL: Optional[QuestionPool] = QuestionPool() if QUESTION_POOL else None
+
 # Rest of your classes...
 
 
@@ -58,8 +114,8 @@ class MsgReq(BaseModel):
     model: str = DEFAULT_CHAT_MODEL
 
 
-class Empty(BaseModel):
-    pass
+class ReindexReq(BaseModel):
+    full: bool = False
 
 
 class GenerateExamReq(BaseModel):
@@ -67,6 +123,8 @@ class GenerateExamReq(BaseModel):
     n: int = 8
     level: str = "intermedio"
     model: str = DEFAULT_EXAM_MODEL
+    context_tokens: Optional[int] = None
+    no_cache: bool = False  # force a fresh generation (the result is still cached)
 
 
 class GenerateInterviewReq(BaseModel):
@@ -75,6 +133,7 @@ class GenerateInterviewReq(BaseModel):
     level: str = "intermedio"
     n_questions: int = 4
     model: str = DEFAULT_EXAM_MODEL
+    no_cache: bool = False  # force a fresh generation (the result is still cached)
 
 
 # Your functions...
@@ -156,6 +215,66 @@ def build_interview_prompt(
     """
 
 
+def build_exam_replacement_prompt(
+    ctx: str, role: str, level: str, existing: List[str], k: int
+) -> str:
+    taken = "\n".join(f"    - {t}" for t in existing)
+    schema = """{
+    "questions": [
+    {"id":"ED-001","q":"texto","options":["A","B","C","D"],
+        "answer":"A","why":"(si procede)","rubrics":["SQL/optimización"]}
+    ]
+    }"""
+    return f"""
+    CONTEXT:
+    ---
+    {ctx}
+    ---
+
+    EXAM:
+    Genera {k} preguntas nuevas para el examen de la vacante {role}, nivel {level}.
+    - Usa SOLO el CONTEXT.
+    - Deben evaluar temas distintos de estas preguntas, que ya están en el examen:
+{taken}
+    - Devuelve SOLO el JSON exacto con este esquema:
+    {schema}
+    """
+
+
+def build_interview_replacement_prompt(
+    vacancy_title: str, requirements: List[str], level: str, existing: List[str], k: int
+) -> str:
+    reqs_text = "\n".join(f"- {r}" for r in requirements)
+    taken = "\n".join(f"- {t}" for t in existing)
+    schema = """{
+    "questions": [
+    {
+      "id": "Q1",
+      "question": "Pregunta técnica o de experiencia",
+      "type": "technical|behavioral|situational",
+      "expected_keywords": ["palabra1", "palabra2"],
+      "rubric": "criterio de evaluación",
+      "weight": 25
+    }
+  ]
+}"""
+    return f"""
+    VACANTE: {vacancy_title}
+    NIVEL: {level}
+
+    REQUISITOS:
+    {reqs_text}
+
+    TAREA:
+    Genera {k} preguntas de entrevista nuevas. La entrevista ya incluye estas
+    preguntas; las nuevas deben evaluar aspectos distintos:
+    {taken}
+
+    Devuelve ÚNICAMENTE el JSON con este esquema exacto:
+    {schema}
+    """
+
+
 @app.get("/")
 def root():
     return {
@@ -167,11 +286,15 @@ def root():
             "/healthz",
             "/ping",
             "/ollama/status",
+            "/stats",
             "/chat/start",
             "/chat/message",
+            "/chat/start/stream",
+            "/chat/message/stream",
             "/reindex",
             "/generate_exam",
             "/generate_interview",
+            "/generate_interview/stream",
             "/docs",
         ],
     }
@@ -187,107 +310,372 @@ def ping():
     return {"ok": True, "has_retriever": HAS_RETRIEVER}
 
 
+@app.get("/stats")
+def stats():
+    r = retriever
+    return {
+        "retriever": r.stats() if r is not None else None,
+        "sessions": SESSIONS.stats(),
+        "chat_history": chat_history_stats(),
+        "generation": GENERATION_STATS,
+        "generation_cache": GENERATION_CACHE.stats(),
+        "generation_inflight": GENERATION_INFLIGHT.stats(),
+        "llm_scheduler": SCHEDULER.stats(),
+        "ollama_backends": BACKENDS.stats(),
+        "ollama_client": ollama_client_stats(),
+        "question_pool": POOL.stats() if POOL is not None else None,
+        "question_dedup": question_dedup_stats(),
+    }
+
+
+@app.exception_handler(LLMUnavailable)
+async def llm_unavailable_handler(request: Request, e: LLMUnavailable):
+    # load shedding (scheduler queue full) or every Ollama circuit open
+    logger.warning(f"Rejected {request.url.path}: {e}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(e)},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+@app.exception_handler(PromptTooLong)
+async def prompt_too_long_handler(request: Request, e: PromptTooLong):
+    return JSONResponse(status_code=413, content={"detail": str(e)})
+
+
+def _seed_pool_targets():
+    # reads kb/vacantes and writes SQLite: called through run_in_threadpool
+    for t in kb_targets():
+        p = t["params"]
+        if t["kind"] == "exam":
+            POOL.want("exam", role_key(p["role"]), p["level"], DEFAULT_EXAM_MODEL, p)
+        else:
+            key = role_key(p["vacancy_title"], p["requirements"])
+            POOL.want("interview", key, p["level"], DEFAULT_EXAM_MODEL, p)
+
+
+@app.on_event("startup")
+async def startup():
+    BACKENDS.start_health_checks(get_async_client)
+    if POOL is not None:
+        await run_in_threadpool(_seed_pool_targets)
+        POOL.start_builder(
+            _pool_build,
+            kb_version=lambda: linked_version() or "",  # not just this worker's retriever
+            idle=SCHEDULER.idle,
+        )
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if POOL is not None:
+        await POOL.stop_builder()
+    await BACKENDS.stop_health_checks()
+    await aclose_client()
+
+
 @app.get("/ollama/status")
-def ollama_status():
+async def ollama_status():
     """Check if Ollama is running and which models are available"""
     try:
-        import requests
-
-        ollama_url = "http://ollama:11434/api/tags"
-        response = requests.get(ollama_url, timeout=5)
-
-        if response.status_code == 200:
-            models = response.json().get("models", [])
-            return {
-                "ok": True,
-                "available_models": [m["name"] for m in models],
-                "default_model": DEFAULT_CHAT_MODEL,
-            }
-        else:
-            return {"ok": False, "error": "Ollama not responding"}
+        return {
+            "ok": True,
+            "available_models": await alist_models(timeout=5),
+            "default_model": DEFAULT_CHAT_MODEL,
+            "backends": BACKENDS.stats(),
+        }
     except Exception as e:
-        return {"ok": False, "error": str(e)}
+        return {"ok": False, "error": str(e), "backends": BACKENDS.stats()}
+
+
+def _sse(data: Dict, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_error(detail: str, e: Exception) -> str:
+    data = {"detail": detail}
+    if isinstance(e, LLMUnavailable):
+        data["retry_after"] = e.retry_after
+    return _sse(data, event="error")
+
+
+def _sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/chat/start")
-def chat_start(req: StartReq):
+async def chat_start(req: StartReq):
     sid = str(uuid4())
 
-    system = req.system
-    SESSIONS[sid] = {"system": system, "history": []}
-    # fmt:off
-    prompt = f"<system>{system}</system>\n<user>Inicia la conversación con un saludo breve.</user>\n<assistant>"
-    # fmt: on
+    session = {"system": req.system, "history": []}
+    messages = build_messages(session, START_TEXT)
     try:
-        first = chat_once(
-            prompt,
-            model=req.model,
-        )
+        first = await achat(messages, model=req.model, session_id=sid)
+    except LLMUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Error in chat_start: {e}")
         raise HTTPException(
             status_code=502, detail=f"Ollama error (start): {e}")
-    SESSIONS[sid]["history"].append(("[start]", first))
+    session["history"].append(["[start]", first])
+    await SESSIONS.aput(sid, session)
     return {"session_id": sid, "message": first}
 
 
 @app.post("/chat/message")
-def chat_message(req: MsgReq):
-    if req.session_id not in SESSIONS:
+async def chat_message(req: MsgReq):
+    session = await SESSIONS.aget(req.session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="session not found")
 
-    session = SESSIONS[req.session_id]
-    system = session["system"]
     history = session["history"]
-
-    turns = history[:]
-    prompt = [f"<system>{system}</system>"]
-    for u, a in turns:
-        if u != "[start]":
-            prompt.append(f"<user>{u}</user>\n<assistant>{a}</assistant>")
-    prompt.append(f"<user>{req.text}</user>\n<assistant>")
+    messages = build_messages(session, req.text)
 
     try:
-        reply = chat_once("\n".join(prompt), model=req.model)
+        reply = await achat(messages, model=req.model, session_id=req.session_id)
+    except LLMUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Error in chat_message: {e}")
         raise HTTPException(
             status_code=502, detail=f"Ollama error (message): {e}")
 
-    history.append((req.text, reply))
+    history.append([req.text, reply])
+    await SESSIONS.aput(req.session_id, session)
+    schedule_compaction(req.session_id, session, SESSIONS, achat_once, req.model)
     return {"message": reply, "turns": len(history)}
 
 
+@app.post("/chat/start/stream")
+async def chat_start_stream(req: StartReq):
+    """Like /chat/start, but tokens are sent as Server-Sent Events.
+
+    Events: `session` (session id), unnamed `{"token": ...}` events, and
+    a final `done` with the full message, or `error`. The session becomes
+    usable once `done` has been sent.
+    """
+    sid = str(uuid4())
+    session = {"system": req.system, "history": []}
+    messages = build_messages(session, START_TEXT)
+
+    async def events():
+        yield _sse({"session_id": sid}, event="session")
+        parts: List[str] = []
+        try:
+            async for token in astream_chat(messages, model=req.model, session_id=sid):
+                parts.append(token)
+                yield _sse({"token": token})
+        except Exception as e:
+            logger.error(f"Error in chat_start_stream: {e}")
+            yield _sse_error(f"Ollama error (start): {e}", e)
+            return
+        first = "".join(parts)
+        session["history"].append(["[start]", first])
+        await SESSIONS.aput(sid, session)
+        yield _sse({"session_id": sid, "message": first}, event="done")
+
+    return _sse_response(events())
+
+
+@app.post("/chat/message/stream")
+async def chat_message_stream(req: MsgReq):
+    """Like /chat/message, but tokens are sent as Server-Sent Events.
+
+    The assembled reply is appended to the session history when the
+    stream completes.
+    """
+    session = await SESSIONS.aget(req.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="session not found")
+
+    messages = build_messages(session, req.text)
+
+    async def events():
+        parts: List[str] = []
+        try:
+            async for token in astream_chat(
+                messages, model=req.model, session_id=req.session_id
+            ):
+                parts.append(token)
+                yield _sse({"token": token})
+        except Exception as e:
+            logger.error(f"Error in chat_message_stream: {e}")
+            yield _sse_error(f"Ollama error (message): {e}", e)
+            return
+        reply = "".join(parts)
+        session["history"].append([req.text, reply])
+        await SESSIONS.aput(req.session_id, session)
+        schedule_compaction(req.session_id, session, SESSIONS, achat_once, req.model)
+        yield _sse({"message": reply, "turns": len(session["history"])}, event="done")
+
+    return _sse_response(events())
+
+
+def _swap_retriever(new: Retriever):
+    # single assignment: in-flight requests keep the snapshot they already hold
+    global retriever, HAS_RETRIEVER
+    retriever = new
+    HAS_RETRIEVER = True
+
+
+_reload_lock = threading.Lock()
+
+
+def _reload_retriever():
+    # runs in a worker thread; concurrent requests wait here and find it done
+    with _reload_lock:
+        version, r = linked_version(), retriever
+        if version is None or (r is not None and r.version == version):
+            return
+        enc, qcache = (r.enc, r.qcache) if r is not None else (None, None)
+        _swap_retriever(Retriever(enc=enc, qcache=qcache))
+        logger.info(f"Loaded KB store version {version} published by another worker")
+
+
+async def _current_retriever() -> Optional[Retriever]:
+    """The retriever for the KB version published now.
+
+    /reindex only swaps the retriever of the worker that ran it; the others
+    notice that the kb_store symlink moved (one readlink per request) and
+    load the new version, reusing their encoder and query cache.
+    """
+    version = linked_version()
+    if version is not None and (retriever is None or retriever.version != version):
+        try:
+            await run_in_threadpool(_reload_retriever)
+        except Exception as e:
+            logger.warning(f"Could not load KB store version {version}: {e}")
+    return retriever
+
+
+REINDEX_JOBS = ReindexJobs(on_ready=_swap_retriever)
+
+
 @app.post("/reindex")
-def reindex(_: Empty):
-    if not HAS_RETRIEVER:
-        raise HTTPException(status_code=503, detail="Retriever not available")
+def reindex(req: ReindexReq):
+    # also the way to build the KB store when the service started without one
+    return REINDEX_JOBS.start(retriever, incremental=not req.full)
 
-    out = subprocess.run(
-        [sys.executable, "rag_index.py"], capture_output=True, text=True
-    )
-    global retriever
-    retriever = Retriever()
-    return {"stdout": out.stdout, "stderr": out.stderr}
+
+@app.get("/reindex/{job_id}")
+def reindex_status(job_id: str):
+    job = REINDEX_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
 
 
 @app.post("/generate_exam")
-def generate_exam(req: GenerateExamReq):
-    if not HAS_RETRIEVER:
+async def generate_exam(req: GenerateExamReq):
+    r = await _current_retriever()  # snapshot, a concurrent /reindex swap won't affect this request
+    if r is None:
         raise HTTPException(
             status_code=503,
             detail="Retriever not available. Cannot generate exam without knowledge base.",
         )
 
-    assert retriever is not None
+    key = cache_key("exam", req.model_dump(exclude={"no_cache"}), r.version)
+    if not req.no_cache:
+        hit = await GENERATION_CACHE.aget(key)
+        if hit is not None:
+            return {**hit, "cached": True}
+        if POOL is not None:
+            role = role_key(req.role)
+            questions = await run_in_threadpool(
+                POOL.take, "exam", role, req.level, req.model, r.version, req.n,
+                r.enc if QUESTION_DEDUP else None,
+            )
+            if questions is not None:
+                return {**_exam_from_pool(req, questions), "cached": False, "pooled": True}
+            params = req.model_dump(exclude={"no_cache"})
+            await run_in_threadpool(POOL.want, "exam", role, req.level, req.model, params)
+
+    with llm_priority("batch"):  # the shared task inherits it, fix-ups included
+        result, shared = await GENERATION_INFLIGHT.do(key, lambda: _generate_exam(req, r, key))
+    if not shared:
+        await _pool_add_exam(req, r.version, result)
+    return {**result, "cached": False, "coalesced": shared}
+
+
+def _keep_ids(old: List[Dict], new: List[Dict]):
+    # a replacement takes the id of the duplicate it replaces
+    for a, b in zip(old, new):
+        if a is not b and "id" in a:
+            b["id"] = a["id"]
+
+
+async def _dedup_exam(req: GenerateExamReq, r: Retriever, ctx: str, out: str) -> str:
+    exam = json.loads(out)
+
+    async def replace(existing: List[str], k: int) -> List[Dict]:
+        prompt = build_exam_replacement_prompt(ctx, req.role, req.level, existing, k)
+        fmt = ollama_format(questions_schema(exam_question_schema(), k))
+        fresh = await achat_once(prompt, model=req.model, format=fmt, hedge=True)
+        return json.loads(fresh).get("questions", [])
+
+    def valid(q: Dict) -> bool:
+        return validate_exam(json.dumps({"questions": [q]}))["ok"]
+
+    try:
+        questions = await dedup_questions(
+            exam["questions"], lambda q: q.get("q", ""), r.enc, replace, valid
+        )
+    except Exception as e:
+        logger.warning(f"Exam dedup failed, keeping the generated questions: {e}")
+        return out
+    if questions is exam["questions"]:
+        return out
+    _keep_ids(exam["questions"], questions)
+    exam["questions"] = questions
+    return json.dumps(exam, ensure_ascii=False)
+
+
+def _exam_from_pool(req: GenerateExamReq, questions: List[Dict]) -> Dict:
+    for i, q in enumerate(questions, 1):
+        q["id"] = f"ED-{i:03d}"
+    exam = {
+        "title": f"Examen {req.role}",
+        "meta": {"level": req.level, "count": len(questions)},
+        "questions": questions,
+    }
+    out = json.dumps(exam, ensure_ascii=False)
+    return {"ok": True, "exam": out, "validation": validate_exam(out), "context": None}
+
+
+async def _pool_add_exam(req: GenerateExamReq, kb_version: str, result: Dict) -> int:
+    if POOL is None or not result["ok"]:
+        return 0
+    questions = json.loads(result["exam"])["questions"]
+    return await run_in_threadpool(
+        POOL.add, "exam", role_key(req.role), req.level, req.model, kb_version, questions
+    )
 
+
+async def _generate_exam(req: GenerateExamReq, r: Retriever, key: str) -> Dict:
     # fmt:off
     query = f"{req.role} {req.level} examen preguntas opciones rúbrica SQL Node pagos"
     # fmt:on
-    ctx = "\n\n".join(d["text"] for d in retriever.topk(query, 6))
+    # encoder/NumPy work is CPU-bound: keep it off the event loop
+    hits = await run_in_threadpool(r.topk_mix, query, EXAM_CONTEXT_MIX)
+    ctx, ctx_stats = pack_context(
+        hits,
+        r.vectors(hits),
+        budget=req.context_tokens or EXAM_CONTEXT_TOKENS,
+        dup_threshold=EXAM_CONTEXT_DUP_THRESHOLD,
+    )
     prompt = build_exam_prompt(ctx, req.role, req.n, req.level)
+    fmt = ollama_format(exam_schema(req.n))
+    GENERATION_STATS["exam"]["calls"] += 1
     try:
-        out = chat_once(prompt, model=req.model)
+        out = await achat_once(prompt, model=req.model, format=fmt, hedge=True)
+    except LLMUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Error in generate_exam: {e}")
         raise HTTPException(
@@ -295,21 +683,164 @@ def generate_exam(req: GenerateExamReq):
         )
     val = validate_exam(out)
     if not val["ok"]:
+        GENERATION_STATS["exam"]["repairs"] += 1
+        logger.warning(f"Exam failed validation, attempting fix: {val}")
         # fmt:off
-        fix = f"Corrige este JSON al esquema exacto, sin texto fuera del JSON.\n\n{out}\n\nESQUEMA:\n{build_exam_prompt(ctx, req.role, req.n, req.level)}"
+        fix = f"Corrige este JSON al esquema exacto, sin texto fuera del JSON.\n\n{out}\n\nESQUEMA:\n{prompt}"
         # fmt: on
-        out = chat_once(fix, model=req.model)
+        out = await achat_once(fix, model=req.model, format=fmt, hedge=True)
+        val = validate_exam(out)
+        if not val["ok"]:
+            GENERATION_STATS["exam"]["repair_failures"] += 1
+    if val["ok"] and QUESTION_DEDUP:
+        out = await _dedup_exam(req, r, ctx, out)
         val = validate_exam(out)
-    return {"ok": val["ok"], "exam": out, "validation": val}
+    result = {"ok": val["ok"], "exam": out, "validation": val, "context": ctx_stats}
+    if val["ok"]:
+        await GENERATION_CACHE.aput(key, result)
+    return result
+
+
+def validate_interview_question(q, i: int):
+    """Raise ValueError if question `i` (1-based) lacks the fields the UI needs."""
+    if not isinstance(q, dict):
+        raise ValueError(f"Question {i} is not an object")
+    if not q.get("question"):
+        raise ValueError(f"Question {i} missing 'question' field")
+    if not q.get("type"):
+        raise ValueError(f"Question {i} missing 'type' field")
+    if not isinstance(q.get("expected_keywords"), list):
+        raise ValueError(f"Question {i} missing 'expected_keywords' list")
+
+
+def interview_cache_key(req: GenerateInterviewReq) -> str:
+    return cache_key("interview", req.model_dump(exclude={"no_cache"}))
+
+
+def parse_interview(response: str, n_questions: int) -> Dict:
+    start = response.find("{")
+    end = response.rfind("}") + 1
+    if start >= 0 and end > start:
+        data = json.loads(response[start:end])
+    else:
+        raise ValueError("No JSON found in response")
+
+    if not isinstance(data.get("questions"), list):
+        raise ValueError("'questions' must be a list")
+
+    if len(data["questions"]) < n_questions:
+        raise ValueError(
+            # fmt:off
+            f"Expected {n_questions} questions, got {len(data['questions'])}"
+            # fmt:on
+        )
+
+    for i, q in enumerate(data["questions"], 1):
+        validate_interview_question(q, i)
+    return data
 
 
 @app.post("/generate_interview")
-def generate_interview(req: GenerateInterviewReq):
+async def generate_interview(req: GenerateInterviewReq):
     """
     Genera preguntas de entrevista basadas en los requisitos de la vacante.
     """
     logger.info(f"Generating interview for: {req.vacancy_title}")
 
+    # the interview prompt doesn't use the KB, so its version isn't part of the key
+    key = interview_cache_key(req)
+    if not req.no_cache:
+        hit = await GENERATION_CACHE.aget(key)
+        if hit is not None:
+            return {**hit, "cached": True}
+        pooled = await _interview_from_pool(req)
+        if pooled is not None:
+            return {**pooled, "cached": False, "pooled": True}
+
+    with llm_priority("batch"):
+        result, shared = await GENERATION_INFLIGHT.do(key, lambda: _generate_interview(req, key))
+    if not shared:
+        await _pool_add_interview(req, result)
+    return {**result, "cached": False, "coalesced": shared}
+
+
+async def _dedup_interview(req: GenerateInterviewReq, data: Dict) -> Dict:
+    r = retriever  # only its encoder is used
+    if not QUESTION_DEDUP or r is None:
+        return data
+
+    async def replace(existing: List[str], k: int) -> List[Dict]:
+        prompt = build_interview_replacement_prompt(
+            req.vacancy_title, req.requirements, req.level, existing, k
+        )
+        fmt = ollama_format(questions_schema(interview_question_schema(), k))
+        fresh = await achat_once(prompt, model=req.model, format=fmt, hedge=True)
+        return parse_interview(fresh, 0)["questions"]
+
+    def valid(q: Dict) -> bool:
+        try:
+            validate_interview_question(q, 0)
+            return True
+        except ValueError:
+            return False
+
+    try:
+        questions = await dedup_questions(
+            data["questions"], lambda q: q.get("question", ""), r.enc, replace, valid
+        )
+    except Exception as e:
+        logger.warning(f"Interview dedup failed, keeping the generated questions: {e}")
+        return data
+    if questions is not data["questions"]:
+        _keep_ids(data["questions"], questions)
+        data["questions"] = questions
+    return data
+
+
+async def _interview_from_pool(req: GenerateInterviewReq) -> Optional[Dict]:
+    """A pooled interview, or None after registering the target for the builder."""
+    if POOL is None:
+        return None
+    role = role_key(req.vacancy_title, req.requirements)
+    r = retriever  # only its encoder is used, to skip near-duplicates
+    enc = r.enc if QUESTION_DEDUP and r is not None else None
+    questions = await run_in_threadpool(
+        POOL.take, "interview", role, req.level, req.model, "", req.n_questions, enc
+    )
+    if questions is None:
+        params = req.model_dump(exclude={"no_cache"})
+        await run_in_threadpool(POOL.want, "interview", role, req.level, req.model, params)
+        return None
+    for i, q in enumerate(questions, 1):
+        q["id"] = f"Q{i}"
+    data = {"vacancy": req.vacancy_title, "level": req.level, "questions": questions}
+    return {"ok": True, "interview": data, "raw_response": json.dumps(data, ensure_ascii=False)}
+
+
+async def _pool_add_interview(req: GenerateInterviewReq, result: Dict) -> int:
+    if POOL is None or not result["ok"]:
+        return 0
+    role = role_key(req.vacancy_title, req.requirements)
+    questions = result["interview"]["questions"]
+    return await run_in_threadpool(POOL.add, "interview", role, req.level, req.model, "", questions)
+
+
+async def _pool_build(target: Dict) -> int:
+    """Question pool builder: one live generation for an under-stocked target."""
+    with llm_priority("batch"):
+        if target["kind"] == "exam":
+            r = await _current_retriever()
+            if r is None:
+                return 0
+            req = GenerateExamReq(**target["params"])
+            key = cache_key("exam", req.model_dump(exclude={"no_cache"}), r.version)
+            return await _pool_add_exam(req, r.version, await _generate_exam(req, r, key))
+        req = GenerateInterviewReq(**target["params"])
+        result = await _generate_interview(req, interview_cache_key(req))
+        return await _pool_add_interview(req, result)
+
+
+async def _generate_interview(req: GenerateInterviewReq, key: str) -> Dict:
     prompt = build_interview_prompt(
         vacancy_title=req.vacancy_title,
         requirements=req.requirements,
@@ -317,63 +848,40 @@ def generate_interview(req: GenerateInterviewReq):
         level=req.level,
     )
 
+    fmt = ollama_format(interview_schema(req.n_questions))
+    GENERATION_STATS["interview"]["calls"] += 1
+
     try:
-        response = chat_once(prompt, model=req.model)
+        response = await achat_once(prompt, model=req.model, format=fmt, hedge=True)
 
         try:
-            start = response.find("{")
-            end = response.rfind("}") + 1
-            if start >= 0 and end > start:
-                json_str = response[start:end]
-                data = json.loads(json_str)
-            else:
-                raise ValueError("No JSON found in response")
-
-            if not isinstance(data.get("questions"), list):
-                raise ValueError("'questions' must be a list")
-
-            if len(data["questions"]) < req.n_questions:
-                raise ValueError(
-                    # fmt:off
-                    f"Expected {req.n_questions} questions, got {len(data['questions'])}"
-                    # fmt:on
-                )
-
-            for i, q in enumerate(data["questions"], 1):
-                if not q.get("question"):
-                    raise ValueError(f"Question {i} missing 'question' field")
-                if not q.get("type"):
-                    raise ValueError(f"Question {i} missing 'type' field")
-                if not isinstance(q.get("expected_keywords"), list):
-                    raise ValueError(
-                        f"Question {i} missing 'expected_keywords' list")
-
-            logger.info(f"✅ Interview generated successfully")
-            return {"ok": True, "interview": data, "raw_response": response}
+            data = parse_interview(response, req.n_questions)
+            result = {"ok": True, "interview": data, "raw_response": response}
 
         except Exception as parse_error:
+            GENERATION_STATS["interview"]["repairs"] += 1
             logger.warning(f"Parse error, attempting fix: {parse_error}")
             fix_prompt = f"""
-                El siguiente JSON tiene errores. Corrígelo para que sea válido:
+                El siguiente JSON tiene errores ({parse_error}). Corrígelo para que sea válido:
 
                 {response}
 
                 Devuelve ÚNICAMENTE el JSON corregido, sin texto adicional.
             """
             try:
-                fixed = chat_once(fix_prompt, model=req.model)
-                start = fixed.find("{")
-                end = fixed.rfind("}") + 1
-                json_str = fixed[start:end]
-                data = json.loads(json_str)
+                fixed = await achat_once(fix_prompt, model=req.model, format=fmt, hedge=True)
+                data = parse_interview(fixed, req.n_questions)
 
-                return {
+                result = {
                     "ok": True,
                     "interview": data,
                     "raw_response": fixed,
                     "was_fixed": True,
                 }
+            except LLMUnavailable:
+                raise
             except Exception as fix_error:
+                GENERATION_STATS["interview"]["repair_failures"] += 1
                 logger.error(f"Failed to fix JSON: {fix_error}")
                 raise HTTPException(
                     status_code=500,
@@ -382,8 +890,105 @@ def generate_interview(req: GenerateInterviewReq):
                     # fmt:on
                 )
 
+    except LLMUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Error in generate_interview: {e}")
         raise HTTPException(
             status_code=502, detail=f"Ollama error (generate_interview): {str(e)}"
         )
+
+    # after the parse/repair step: dedup problems never trigger a JSON repair
+    result["interview"] = await _dedup_interview(req, result["interview"])
+    logger.info("✅ Interview generated successfully")
+    await GENERATION_CACHE.aput(key, result)
+    return result
+
+
+async def _replay_interview_events(result: Dict, **flags):
+    for i, q in enumerate(result["interview"]["questions"], 1):
+        yield _sse({"index": i, "question": q}, event="question")
+    yield _sse({"ok": True, "interview": result["interview"], **flags}, event="done")
+
+
+@app.post("/generate_interview/stream")
+async def generate_interview_stream(req: GenerateInterviewReq):
+    """Like /generate_interview, but each question is sent as soon as the
+    model has finished writing it (Server-Sent Events).
+
+    Events: `question` ({"index", "question"}) per validated question, a
+    final `done` with the whole interview, or `error`. A malformed question
+    cancels the generation right away instead of after the full output.
+    There is no JSON fix-up call in this mode. Near-duplicate questions are
+    replaced once the stream ends, like in /generate_interview: the new
+    question is sent as another `question` event with the same index, before
+    `done`. Cached and pooled interviews are replayed as the same events.
+    """
+    logger.info(f"Streaming interview for: {req.vacancy_title}")
+
+    key = interview_cache_key(req)
+    if not req.no_cache:
+        hit = await GENERATION_CACHE.aget(key)
+        if hit is not None:
+            return _sse_response(_replay_interview_events(hit, cached=True))
+        pooled = await _interview_from_pool(req)
+        if pooled is not None:
+            return _sse_response(_replay_interview_events(pooled, pooled=True))
+
+    prompt = build_interview_prompt(
+        vacancy_title=req.vacancy_title,
+        requirements=req.requirements,
+        n=req.n_questions,
+        level=req.level,
+    )
+    fmt = ollama_format(interview_schema(req.n_questions))
+    stats = GENERATION_STATS["interview"]
+    stats["streams"] += 1
+
+    async def events():
+        parser = ArrayItemStream("questions")
+        questions: List[Dict] = []
+        tokens = astream_once(prompt, model=req.model, format=fmt)
+        try:
+            with llm_priority("batch"):
+                async for token in tokens:
+                    for q in parser.feed(token):
+                        validate_interview_question(q, len(questions) + 1)
+                        questions.append(q)
+                        yield _sse({"index": len(questions), "question": q}, event="question")
+        except ValueError as e:  # malformed JSON or question
+            stats["streams_cancelled"] += 1
+            logger.warning(f"Cancelling interview stream: {e}")
+            yield _sse({"detail": f"Malformed interview output: {e}"}, event="error")
+            return
+        except Exception as e:
+            logger.error(f"Error in generate_interview_stream: {e}")
+            yield _sse_error(f"Ollama error (generate_interview): {e}", e)
+            return
+        finally:
+            await tokens.aclose()  # stops generation on the Ollama side
+
+        if len(questions) < req.n_questions:
+            yield _sse(
+                {"detail": f"Expected {req.n_questions} questions, got {len(questions)}"},
+                event="error",
+            )
+            return
+        try:
+            data = parser.document()
+        except ValueError:
+            data = {"vacancy": req.vacancy_title, "level": req.level}
+        data["questions"] = questions
+        # same result as /generate_interview: it is cached and pooled under the same key
+        with llm_priority("batch"):
+            data = await _dedup_interview(req, data)
+        for i, (old, q) in enumerate(zip(questions, data["questions"]), 1):
+            if q is not old:
+                yield _sse({"index": i, "question": q}, event="question")
+        logger.info("✅ Interview streamed successfully")
+        result = {"ok": True, "interview": data, "raw_response": parser.text}
+        await GENERATION_CACHE.aput(key, result)
+        await _pool_add_interview(req, result)
+        yield _sse({"ok": True, "interview": data, "cached": False}, event="done")
+
+    return _sse_response(events())
@@ -0,0 +1,169 @@
+# ai-service/ollama_backends.py
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+import httpx
+
+from circuit_breaker import OPEN, CircuitBreaker, CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+# Several Ollama replicas behind one ai-service:
+#   OLLAMA_HOSTS=http://ollama-1:11434,http://ollama-2:11434
+# Unset, it is the single server the sync client uses: the scheme and host of
+# OLLAMA_URL, which itself defaults to OLLAMA_HOST. Async calls keep the
+# paths of OLLAMA_URL / OLLAMA_CHAT_URL (see ollama_client). Requests go to the backend with the fewest
+# outstanding calls; chat sessions stick to one backend (rendezvous hashing on
+# the session id) so the replica keeps reusing its KV cache for that
+# conversation, and only move if it is taken out. Each backend has a circuit
+# breaker (circuit_breaker.py) fed by the calls made to it and by an
+# /api/tags probe every OLLAMA_HEALTH_INTERVAL seconds; a backend with an
+# open circuit gets no traffic, and when every circuit is open calls fail at
+# once with CircuitOpen instead of waiting on a stalled host.
+def _default_host() -> str:
+    host = os.getenv("OLLAMA_HOST", "http://ollama:11434").rstrip("/")
+    url = urlparse(os.getenv("OLLAMA_URL", f"{host}/api/generate"))
+    return f"{url.scheme}://{url.netloc}"
+
+
+OLLAMA_HOSTS = [
+    h.strip().rstrip("/")
+    for h in (os.getenv("OLLAMA_HOSTS") or _default_host()).split(",")
+    if h.strip()
+]
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", 10))
+
+
+def is_backend_failure(e: BaseException) -> bool:
+    """Errors that say something about the backend, not about the request."""
+    if isinstance(e, (httpx.TransportError, httpx.TimeoutException)):
+        return True
+    return isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500
+
+
+class Backend:
+    def __init__(self, url: str):
+        self.url = url
+        self.breaker = CircuitBreaker(url)
+        self.outstanding = 0
+        self.requests = self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.allow()
+
+    def stats(self) -> Dict:
+        return {
+            "url": self.url,
+            "available": self.available,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "circuit": self.breaker.stats(),
+        }
+
+
+class Call:
+    """One request to a backend, as seen by BackendPool.use()."""
+
+    def __init__(self, backend: Backend):
+        self.backend, self.url = backend, backend.url
+        self.started = time.monotonic()
+        self.response_time: Optional[float] = None
+
+    def responded(self):
+        """Mark the first byte (streams): slowness is judged up to here.
+
+        Non-streaming calls never mark it: Ollama sends their headers only
+        when the whole generation is done, so their duration says nothing
+        about the backend and they stay out of the slow-call count.
+        """
+        if self.response_time is None:
+            self.response_time = time.monotonic() - self.started
+
+
+class BackendPool:
+    def __init__(self, urls: List[str] = OLLAMA_HOSTS):
+        self.backends = [Backend(u) for u in urls]
+        self._health: Optional[asyncio.Task] = None
+
+    def pick(self, sticky: Optional[str] = None, exclude: Set[str] = frozenset()) -> Backend:
+        live = [b for b in self.backends if b.url not in exclude and b.available]
+        if not live:
+            others = [b for b in self.backends if b.url not in exclude] or self.backends
+            retry = min(b.breaker.retry_after() for b in others)
+            raise CircuitOpen(f"No Ollama backend available, retry in {retry}s", retry)
+        if sticky is not None:
+            return max(live, key=lambda b: hashlib.sha1(f"{sticky}|{b.url}".encode()).digest())
+        return min(live, key=lambda b: (b.outstanding, b.requests))
+
+    def has_alternative(self, exclude: Set[str]) -> bool:
+        return any(b.url not in exclude and b.available for b in self.backends)
+
+    @asynccontextmanager
+    async def use(self, sticky: Optional[str] = None, exclude: Set[str] = frozenset()):
+        """Pick a backend and account the call made inside the block to it."""
+        b = self.pick(sticky, exclude)
+        call = Call(b)
+        b.breaker.begin()
+        b.outstanding += 1
+        b.requests += 1
+        try:
+            yield call
+        except Exception as e:
+            if is_backend_failure(e):
+                b.errors += 1
+                b.breaker.record(False, time.monotonic() - call.started)
+            else:
+                b.breaker.abandon()
+            raise
+        except BaseException:  # cancelled / generator closed early
+            b.breaker.abandon()
+            raise
+        else:
+            b.breaker.record(True, call.response_time)
+        finally:
+            b.outstanding -= 1
+
+    async def probe(self, client: httpx.AsyncClient, b: Backend, timeout: float = 5):
+        try:
+            r = await client.get(f"{b.url}/api/tags", timeout=timeout)
+            r.raise_for_status()
+        except Exception as e:
+            if b.breaker.state != OPEN:
+                b.breaker.trip(f"health check failed ({e})")
+            return False
+        b.breaker.probe_ok()
+        return True
+
+    async def _health_loop(self, client_factory):
+        while True:
+            await asyncio.sleep(OLLAMA_HEALTH_INTERVAL)
+            client = client_factory()
+            await asyncio.gather(*(self.probe(client, b) for b in self.backends))
+
+    def start_health_checks(self, client_factory):
+        if self._health is None:
+            self._health = asyncio.get_running_loop().create_task(self._health_loop(client_factory))
+
+    async def stop_health_checks(self):
+        if self._health is not None:
+            self._health.cancel()
+            try:
+                await self._health
+            except asyncio.CancelledError:
+                pass
+            self._health = None
+
+    def stats(self) -> List[Dict]:
+        return [b.stats() for b in self.backends]
+
+
+BACKENDS = BackendPool()
@@ -1,39 +1,312 @@
 ﻿# ai-service/ollama_client.py
 
 import os
-import requests
+import json
+import asyncio
+import httpx
+import time
 import logging
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set, Union
+from urllib.parse import urlparse
+from llm_scheduler import SCHEDULER
+from ollama_backends import BACKENDS, OLLAMA_HOSTS
 
 logger = logging.getLogger(__name__)
 
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434/api/generate")
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434").rstrip("/")
+OLLAMA_URL = os.getenv("OLLAMA_URL", f"{OLLAMA_HOST}/api/generate")
+OLLAMA_CHAT_URL = os.getenv("OLLAMA_CHAT_URL", f"{OLLAMA_HOST}/api/chat")
+# async calls go to one of ollama_backends.BACKENDS (OLLAMA_HOSTS) at these paths
+GENERATE_PATH = urlparse(OLLAMA_URL).path or "/api/generate"
+CHAT_PATH = urlparse(OLLAMA_CHAT_URL).path or "/api/chat"
 
+# Timeouts / retries for every call to Ollama. The client's connection pool
+# is sized from the scheduler (see get_async_client) so the two limits can't
+# disagree.
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 3.05))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", 120))
+OLLAMA_RETRIES = int(os.getenv("OLLAMA_RETRIES", 3))
+OLLAMA_BACKOFF = float(os.getenv("OLLAMA_BACKOFF", 0.5))
 
-def chat_once(prompt: str, model: str = "llama3.2") -> str:
-    """Send prompt to Ollama and get response"""
+# Hedging for idempotent generations (achat_once(..., hedge=True)): if the
+# first backend hasn't answered within the OLLAMA_HEDGE_PERCENTILE latency of
+# recent calls to the same endpoint (timed from when the call got its
+# scheduler slot and backend, like the samples), the same request is sent to
+# a different healthy backend and the first answer wins. No hedge when there
+# is no such backend.
+OLLAMA_HEDGE = os.getenv("OLLAMA_HEDGE", "0") == "1"
+OLLAMA_HEDGE_PERCENTILE = float(os.getenv("OLLAMA_HEDGE_PERCENTILE", 95))
+OLLAMA_HEDGE_MIN_DELAY = float(os.getenv("OLLAMA_HEDGE_MIN_DELAY", 1.0))
+OLLAMA_HEDGE_MIN_SAMPLES = int(os.getenv("OLLAMA_HEDGE_MIN_SAMPLES", 20))
+
+_aclient: Optional[httpx.AsyncClient] = None
+_latency: Dict[str, Deque[float]] = {}  # path -> recent successful call durations (s)
+HEDGE_STATS = {"hedged": 0, "hedge_wins": 0}
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Module-level httpx.AsyncClient, created on first use in the event loop.
+
+    One connection per scheduler slot (LLM_MAX_CONCURRENCY, hedges included)
+    plus one per backend for health probes, so the scheduler is the only
+    limit on concurrent generations.
+    """
+    global _aclient
+    if _aclient is None:
+        pool = SCHEDULER.max_concurrency + len(BACKENDS.backends)
+        _aclient = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool, max_keepalive_connections=pool),
+            timeout=httpx.Timeout(
+                OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT, pool=None
+            ),
+        )
+    return _aclient
+
+
+async def aclose_client():
+    global _aclient
+    if _aclient is not None:
+        await _aclient.aclose()
+        _aclient = None
+
+
+async def _apost_once(
+    path: str,
+    payload: Dict,
+    sticky: Optional[str] = None,
+    used: Optional[Set[str]] = None,
+    exclude: Set[str] = frozenset(),
+    started: Optional[asyncio.Event] = None,
+) -> Dict:
+    """POST with backoff retries on connection errors, in a scheduler slot.
+
+    Each attempt picks a backend (see ollama_backends), so a retry after a
+    connection error can land on another replica; the backends tried are
+    added to `used` and backends in `exclude` are skipped. `started` is set
+    once the call holds a slot and a backend. Raises llm_errors.LLMUnavailable
+    if the caller's priority queue is full or no backend is available.
+    """
+    client = get_async_client()
+    used = set() if used is None else used
+    async with SCHEDULER.slot():
+        for attempt in range(OLLAMA_RETRIES + 1):
+            try:
+                async with BACKENDS.use(sticky, exclude) as b:
+                    used.add(b.url)
+                    if started is not None:
+                        started.set()
+                    t0 = time.monotonic()
+                    r = await client.post(f"{b.url}{path}", json=payload)
+                    r.raise_for_status()
+                    data = r.json()
+                    _latency.setdefault(path, deque(maxlen=200)).append(time.monotonic() - t0)
+                    return data
+            except httpx.ConnectError:
+                if attempt == OLLAMA_RETRIES:
+                    raise
+                await asyncio.sleep(OLLAMA_BACKOFF * 2**attempt)
+
+
+def hedge_delay(path: str) -> Optional[float]:
+    """Seconds to wait before hedging a call to `path`, None if not enough data."""
+    samples = sorted(_latency.get(path, ()))
+    if len(samples) < OLLAMA_HEDGE_MIN_SAMPLES:
+        return None
+    i = min(len(samples) - 1, int(len(samples) * OLLAMA_HEDGE_PERCENTILE / 100))
+    return max(OLLAMA_HEDGE_MIN_DELAY, samples[i])
+
+
+async def _apost(path: str, payload: Dict, sticky: Optional[str] = None, hedge: bool = False) -> Dict:
+    delay = hedge_delay(path) if hedge and OLLAMA_HEDGE else None
+    if delay is None:
+        return await _apost_once(path, payload, sticky)
+
+    loop = asyncio.get_running_loop()
+    used: Set[str] = set()
+    started = asyncio.Event()
+    tasks = [loop.create_task(_apost_once(path, payload, sticky, used, started=started))]
+    waiting = loop.create_task(started.wait())
+    try:
+        # the delay is backend time (like the samples): queueing for a slot doesn't count
+        await asyncio.wait([tasks[0], waiting], return_when=asyncio.FIRST_COMPLETED)
+        if tasks[0].done() or not BACKENDS.has_alternative(used):
+            return await tasks[0]
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not BACKENDS.has_alternative(used):
+            return await tasks[0]
+        HEDGE_STATS["hedged"] += 1
+        logger.info(f"Hedging {path} after {delay:.1f}s")
+        tasks.append(loop.create_task(_apost_once(path, payload, exclude=set(used))))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    HEDGE_STATS["hedge_wins"] += t is tasks[1]
+                    return t.result()
+        return tasks[0].result()  # both failed: report the original error
+    finally:
+        waiting.cancel()
+        for t in tasks:
+            t.cancel()  # the loser: closing its connection stops the generation
+
+
+async def alist_models(timeout: float = 5) -> List[str]:
+    r = await get_async_client().get(f"{BACKENDS.pick().url}/api/tags", timeout=timeout)
+    r.raise_for_status()
+    return [m["name"] for m in r.json().get("models", [])]
+
+
+async def achat_once(
+    prompt: str,
+    model: str = "llama3.2",
+    format: Optional[Union[str, Dict]] = None,
+    hedge: bool = False,
+) -> str:
+    """Send prompt to Ollama (/api/generate) and return the response text.
+
+    `format` is passed to Ollama as-is: "json" or a JSON schema constrains
+    the output (structured outputs). `hedge=True` allows a hedged second
+    request (OLLAMA_HEDGE); only for calls that are safe to run twice.
+    """
     logger.info(f"Sending prompt to Ollama (model: {model})")
 
-    payload = {
+    payload: Dict = {
         "model": model,
         "prompt": prompt,
         "stream": False,
         "options": {"temperature": 0.2},
     }
+    if format is not None:
+        payload["format"] = format
 
     try:
-        r = requests.post(OLLAMA_URL, json=payload, timeout=120)
-        r.raise_for_status()
-        data = r.json()
+        data = await _apost(GENERATE_PATH, payload, hedge=hedge)
 
         if "response" not in data:
             raise RuntimeError(f"Unexpected Ollama response: {data}")
 
         logger.info("✅ Got response from Ollama")
         return data["response"]
-    except requests.exceptions.ConnectionError as e:
-        logger.error(f"Cannot connect to Ollama at {OLLAMA_URL}")
+    except httpx.ConnectError as e:
+        logger.error(f"Cannot connect to Ollama backends: {OLLAMA_HOSTS}")
+        raise RuntimeError(f"Ollama service not available: {e}")
+    except Exception as e:
+        logger.error(f"Error calling Ollama: {e}")
+        raise
+
+
+async def _astream(
+    path: str, payload: Dict, field, sticky: Optional[str] = None
+) -> AsyncIterator[str]:
+    """Yield `field(chunk)` for each NDJSON chunk of a streaming Ollama call."""
+    client = get_async_client()
+    async with SCHEDULER.slot(), BACKENDS.use(sticky) as b:
+        async with client.stream("POST", f"{b.url}{path}", json=payload) as r:
+            r.raise_for_status()
+            b.responded()  # a long stream isn't a slow backend
+            async for line in r.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(f"Ollama error: {data['error']}")
+                token = field(data)
+                if token:
+                    yield token
+                if data.get("done"):
+                    break
+
+
+async def astream_once(
+    prompt: str, model: str = "llama3.2", format: Optional[Union[str, Dict]] = None
+) -> AsyncIterator[str]:
+    """Stream the completion token by token (Ollama NDJSON, "stream": true).
+
+    Closing the generator early (aclose) closes the HTTP response, which
+    makes Ollama stop generating.
+    """
+    logger.info(f"Streaming prompt to Ollama (model: {model})")
+
+    payload: Dict = {
+        "model": model,
+        "prompt": prompt,
+        "stream": True,
+        "options": {"temperature": 0.2},
+    }
+    if format is not None:
+        payload["format"] = format
+    tokens = _astream(GENERATE_PATH, payload, lambda d: d.get("response"))
+    # closing this generator must close _astream right away (scheduler slot,
+    # backend, HTTP response), not whenever the GC gets to finalize it
+    async with aclosing(tokens):
+        async for token in tokens:
+            yield token
+
+
+async def achat(
+    messages: List[Dict], model: str = "llama3.2", session_id: Optional[str] = None
+) -> str:
+    """Multi-turn call to /api/chat with structured messages.
+
+    Each turn only appends to the message list, so the prompt Ollama
+    renders shares its prefix with the previous turn and the runner reuses
+    the KV cache for it: only the new messages are evaluated. Pass
+    `session_id` so every turn goes to the backend holding that cache.
+    """
+    logger.info(f"Sending chat to Ollama (model: {model}, messages: {len(messages)})")
+
+    payload: Dict = {
+        "model": model,
+        "messages": messages,
+        "stream": False,
+        "options": {"temperature": 0.2},
+    }
+
+    try:
+        data = await _apost(CHAT_PATH, payload, sticky=session_id)
+
+        if "message" not in data:
+            raise RuntimeError(f"Unexpected Ollama response: {data}")
+
+        logger.info("✅ Got response from Ollama")
+        return data["message"].get("content", "")
+    except httpx.ConnectError as e:
+        logger.error(f"Cannot connect to Ollama backends: {OLLAMA_HOSTS}")
         raise RuntimeError(f"Ollama service not available: {e}")
     except Exception as e:
         logger.error(f"Error calling Ollama: {e}")
         raise
 
+
+async def astream_chat(
+    messages: List[Dict], model: str = "llama3.2", session_id: Optional[str] = None
+) -> AsyncIterator[str]:
+    """Streaming variant of achat."""
+    logger.info(f"Streaming chat to Ollama (model: {model}, messages: {len(messages)})")
+
+    payload: Dict = {
+        "model": model,
+        "messages": messages,
+        "stream": True,
+        "options": {"temperature": 0.2},
+    }
+    tokens = _astream(
+        CHAT_PATH,
+        payload,
+        lambda d: (d.get("message") or {}).get("content"),
+        sticky=session_id,
+    )
+    async with aclosing(tokens):  # see astream_once
+        async for token in tokens:
+            yield token
+
+
+def stats() -> Dict:
+    return {
+        "hedging": OLLAMA_HEDGE,
+        **HEDGE_STATS,
+        "hedge_delay": {p: hedge_delay(p) for p in _latency},
+    }
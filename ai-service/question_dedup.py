@@ -0,0 +1,83 @@
+# ai-service/question_dedup.py
+
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Near-duplicate questions in a generated exam/interview: the texts are
+# embedded with the retriever's MiniLM encoder (already loaded) and
+# clustered greedily by cosine similarity; the first question of each
+# cluster is kept and only the others are replaced, with one small LLM call
+# that asks for that many new questions, instead of regenerating the set.
+QUESTION_DEDUP = os.getenv("QUESTION_DEDUP", "1") == "1"
+QUESTION_DEDUP_THRESHOLD = float(os.getenv("QUESTION_DEDUP_THRESHOLD", 0.9))
+
+STATS = {"checked": 0, "duplicates": 0, "replacement_calls": 0, "replaced": 0, "unresolved": 0}
+
+
+def near_duplicates(texts: List[str], enc, threshold: float = QUESTION_DEDUP_THRESHOLD) -> List[int]:
+    """Indexes of texts too similar to an earlier kept one (greedy clustering)."""
+    if len(texts) < 2:
+        return []
+    embs = np.asarray(enc.encode(texts, normalize_embeddings=True), dtype=np.float32)
+    kept, dups = [0], []
+    for i in range(1, len(texts)):
+        if float((embs[kept] @ embs[i]).max()) >= threshold:
+            dups.append(i)
+        else:
+            kept.append(i)
+    return dups
+
+
+async def dedup_questions(
+    questions: List[Dict],
+    text_of: Callable[[Dict], str],
+    enc,
+    replace: Callable[[List[str], int], Awaitable[List[Dict]]],
+    valid: Callable[[Dict], bool],
+    threshold: float = QUESTION_DEDUP_THRESHOLD,
+) -> List[Dict]:
+    """Return `questions` with near-duplicates swapped for fresh ones.
+
+    `replace(kept_texts, k)` asks the LLM for k new questions unlike
+    kept_texts. Replacements that are invalid or duplicates themselves are
+    discarded; a duplicate without a replacement is left in place, so the
+    question count never drops.
+    """
+    STATS["checked"] += 1
+    texts = [text_of(q) for q in questions]
+    dups = await asyncio.to_thread(near_duplicates, texts, enc, threshold)
+    if not dups:
+        return questions
+    STATS["duplicates"] += len(dups)
+    kept = [t for i, t in enumerate(texts) if i not in set(dups)]
+    logger.info(f"{len(dups)} near-duplicate question(s), requesting replacements")
+
+    try:
+        STATS["replacement_calls"] += 1
+        fresh = [q for q in await replace(kept, len(dups)) if valid(q)]
+    except Exception as e:
+        logger.warning(f"Question replacement failed: {e}")
+        fresh = []
+    accepted: List[Dict] = []
+    if fresh:
+        bad = set(await asyncio.to_thread(
+            near_duplicates, kept + [text_of(q) for q in fresh], enc, threshold
+        ))
+        accepted = [q for j, q in enumerate(fresh) if len(kept) + j not in bad][:len(dups)]
+
+    out = list(questions)
+    for i, q in zip(dups, accepted):
+        out[i] = q
+    STATS["replaced"] += len(accepted)
+    STATS["unresolved"] += len(dups) - len(accepted)
+    return out
+
+
+def stats() -> Dict:
+    return {"enabled": QUESTION_DEDUP, "threshold": QUESTION_DEDUP_THRESHOLD, **STATS}
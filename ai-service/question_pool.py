@@ -0,0 +1,288 @@
+# ai-service/question_pool.py
+
+import os
+import re
+import json
+import fcntl
+import time
+import random
+import sqlite3
+import hashlib
+import asyncio
+import threading
+import logging
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from question_dedup import near_duplicates
+
+logger = logging.getLogger(__name__)
+
+# Warm inventory of validated questions, so /generate_exam and
+# /generate_interview can answer in milliseconds instead of waiting for a
+# CPU generation. Questions are stored one per row in SQLite, indexed by
+# target = (kind, role, level, model) and, for exams, the KB version their
+# context came from. Every live generation adds its questions; a background
+# builder tops up targets below QUESTION_POOL_MIN while the LLM is idle.
+# Targets are seeded from the kb/vacantes frontmatter and from the requests
+# that missed the pool. Off by default; point QUESTION_POOL_DB at a data
+# volume (not the source directory) when enabling it. With several uvicorn
+# workers sharing the database, only the one holding <db>.builder.lock runs
+# the builder. All SQLite calls from async code go through a worker thread.
+# Only exact repeats are rejected when storing, so rewordings of the same
+# question accumulate across generations: take() draws
+# QUESTION_POOL_OVERSAMPLE times the questions it needs and drops near-
+# duplicates (question_dedup.near_duplicates) before picking.
+QUESTION_POOL = os.getenv("QUESTION_POOL", "0") == "1"
+QUESTION_POOL_DB = os.getenv("QUESTION_POOL_DB", "question_pool.db")
+QUESTION_POOL_MIN = int(os.getenv("QUESTION_POOL_MIN", 24))  # per target
+QUESTION_POOL_INTERVAL = float(os.getenv("QUESTION_POOL_INTERVAL", 30))  # builder tick (s)
+QUESTION_POOL_OVERSAMPLE = int(os.getenv("QUESTION_POOL_OVERSAMPLE", 2))
+QUESTION_POOL_TARGETS = int(os.getenv("QUESTION_POOL_TARGETS", 200))  # most recent kept
+# a build that added nothing new (the model repeats itself) parks the target
+QUESTION_POOL_STALL = float(os.getenv("QUESTION_POOL_STALL", 3600))
+
+
+def _norm(s: str) -> str:
+    return re.sub(r"\s+", " ", s).strip().lower()
+
+
+def role_key(role: str, requirements: Optional[List[str]] = None) -> str:
+    """Interview questions depend on the requirements too, exams only on the role."""
+    if requirements is None:
+        return _norm(role)
+    return f"{_norm(role)} | " + "; ".join(sorted(_norm(r) for r in requirements))
+
+
+def question_text(kind: str, q: Dict) -> str:
+    return q.get("q", "") if kind == "exam" else q.get("question", "")
+
+
+def kb_targets(root: str = "kb/vacantes") -> List[Dict]:
+    """(kind, params) targets from the vacancies' YAML frontmatter."""
+    out = []
+    for p in sorted(Path(root).glob("**/*.md")):
+        text = p.read_text(encoding="utf-8").lstrip("\ufeff")
+        m = re.match(r"---\n(.*?)\n---", text, re.S)
+        if not m:
+            continue
+        fm = m.group(1)
+        role = re.search(r"^role:\s*(.+)$", fm, re.M)
+        if not role:
+            continue
+        level = re.search(r"level:\s*([\w-]+)", fm)
+        n = re.search(r"questions:\s*(\d+)", fm)
+        must = re.search(r"^must_have:\s*\[(.*)\]", fm, re.M)
+        role, level = role.group(1).strip(), level.group(1) if level else "intermedio"
+        out.append({"kind": "exam", "params": {"role": role, "level": level,
+                                              "n": int(n.group(1)) if n else 8}})
+        if must:
+            reqs = [r.strip() for r in must.group(1).split(",") if r.strip()]
+            out.append({"kind": "interview", "params": {"vacancy_title": role,
+                                                       "requirements": reqs, "level": level}})
+    return out
+
+
+class QuestionPool:
+    def __init__(self, path: str = QUESTION_POOL_DB):
+        self.path = path
+        self._builder_lock = None  # open lock file while this process is the builder
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            " id INTEGER PRIMARY KEY, kind TEXT NOT NULL, role TEXT NOT NULL,"
+            " level TEXT NOT NULL, model TEXT NOT NULL, kb_version TEXT NOT NULL,"
+            " qhash TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL,"
+            " served INTEGER NOT NULL DEFAULT 0,"
+            " UNIQUE (kind, role, level, model, kb_version, qhash))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS questions_target"
+            " ON questions(kind, role, level, model, kb_version, served)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS targets ("
+            " kind TEXT NOT NULL, role TEXT NOT NULL, level TEXT NOT NULL,"
+            " model TEXT NOT NULL, params TEXT NOT NULL, last_requested REAL NOT NULL,"
+            " next_build REAL NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (kind, role, level, model))"
+        )
+        self._lock = threading.Lock()
+        self._builder: Optional[asyncio.Task] = None
+        self.hits = self.misses = 0
+        self.built = self.build_errors = 0
+
+    def add(self, kind: str, role: str, level: str, model: str, kb_version: str,
+            questions: List[Dict]) -> int:
+        """Store validated questions; exact duplicates (same text) are skipped."""
+        rows = []
+        for q in questions:
+            text = question_text(kind, q)
+            if not text:
+                continue
+            qhash = hashlib.sha1(_norm(text).encode("utf-8")).hexdigest()
+            rows.append((kind, role, _norm(level), model, kb_version or "", qhash,
+                         json.dumps(q, ensure_ascii=False), time.time()))
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO questions"
+                " (kind, role, level, model, kb_version, qhash, data, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return self._db.total_changes - before
+
+    def take(self, kind: str, role: str, level: str, model: str, kb_version: str,
+             n: int, enc=None) -> Optional[List[Dict]]:
+        """n distinct questions, least served first (random among equals), or None.
+
+        With `enc` (the retriever's encoder) near-duplicates are skipped too;
+        of each group of rewordings the least served one is kept.
+        """
+        limit = n * max(1, QUESTION_POOL_OVERSAMPLE) if enc is not None else n
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, data FROM questions"
+                " WHERE kind = ? AND role = ? AND level = ? AND model = ? AND kb_version = ?"
+                " ORDER BY served, RANDOM() LIMIT ?",
+                (kind, role, _norm(level), model, kb_version or "", limit),
+            ).fetchall()
+        picked = [(r[0], json.loads(r[1])) for r in rows]
+        if enc is not None and len(picked) >= n:
+            dups = set(near_duplicates([question_text(kind, q) for _, q in picked], enc))
+            picked = [p for i, p in enumerate(picked) if i not in dups]
+        picked = picked[:n]
+        with self._lock:
+            if len(picked) < n:
+                self.misses += 1
+                return None
+            self._db.executemany(
+                "UPDATE questions SET served = served + 1 WHERE id = ?", [(i,) for i, _ in picked]
+            )
+            self.hits += 1
+        questions = [q for _, q in picked]
+        random.shuffle(questions)
+        return questions
+
+    def want(self, kind: str, role: str, level: str, model: str, params: Dict):
+        """Remember a target so the builder keeps it stocked."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO targets (kind, role, level, model, params, last_requested)"
+                " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(kind, role, level, model) DO UPDATE"
+                " SET params = excluded.params, last_requested = excluded.last_requested",
+                (kind, role, _norm(level), model, json.dumps(params, ensure_ascii=False), time.time()),
+            )
+            self._db.execute(
+                "DELETE FROM targets WHERE rowid IN (SELECT rowid FROM targets"
+                " ORDER BY last_requested DESC LIMIT -1 OFFSET ?)",
+                (QUESTION_POOL_TARGETS,),
+            )
+
+    def next_target(self, kb_version: str) -> Optional[Dict]:
+        """Most recently requested target with fewer than QUESTION_POOL_MIN questions."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT t.kind, t.role, t.level, t.model, t.params FROM targets t"
+                " LEFT JOIN questions q"
+                " ON q.kind = t.kind AND q.role = t.role AND q.level = t.level"
+                " AND q.model = t.model"
+                " AND q.kb_version = CASE t.kind WHEN 'exam' THEN ? ELSE '' END"
+                " WHERE t.next_build <= ?"
+                " GROUP BY t.kind, t.role, t.level, t.model"
+                " HAVING COUNT(q.id) < ? ORDER BY t.last_requested DESC LIMIT 1",
+                (kb_version or "", time.time(), QUESTION_POOL_MIN),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("kind", "role", "level", "model"), row[:4]), params=json.loads(row[4]))
+
+    def mark_built(self, target: Dict, added: int):
+        delay = QUESTION_POOL_STALL if added == 0 else 0
+        with self._lock:
+            self._db.execute(
+                "UPDATE targets SET next_build = ?"
+                " WHERE kind = ? AND role = ? AND level = ? AND model = ?",
+                (time.time() + delay, target["kind"], target["role"], target["level"], target["model"]),
+            )
+
+    def prune(self, kb_version: str):
+        """Drop exam questions built from a KB version that is no longer served."""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM questions WHERE kind = 'exam' AND kb_version != ?", (kb_version or "",)
+            )
+
+    def _is_builder(self) -> bool:
+        """Take (or keep) the builder lock; False while another process holds it."""
+        if self._builder_lock is None:
+            f = open(f"{self.path}.builder.lock", "w")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            self._builder_lock = f
+            logger.info(f"Question pool builder running in process {os.getpid()}")
+        return True
+
+    async def _build_loop(self, build: Callable[[Dict], Awaitable[int]],
+                          kb_version: Callable[[], str], idle: Callable[[], bool]):
+        while True:
+            await asyncio.sleep(QUESTION_POOL_INTERVAL)
+            # retried every tick: takes over if the builder's process exits
+            if not self._is_builder() or not idle():
+                continue
+            version = kb_version()
+            await asyncio.to_thread(self.prune, version)
+            target = await asyncio.to_thread(self.next_target, version)
+            if target is None:
+                continue
+            try:
+                added = await build(target)
+                self.built += 1
+            except Exception as e:
+                added = 0
+                self.build_errors += 1
+                logger.warning(f"Question pool build failed for {target['params']}: {e}")
+            await asyncio.to_thread(self.mark_built, target, added)
+
+    def start_builder(self, build, kb_version, idle):
+        """Run `build(target)` (returns new questions added) for under-stocked
+        targets whenever `idle()`."""
+        if self._builder is None:
+            self._builder = asyncio.get_running_loop().create_task(
+                self._build_loop(build, kb_version, idle)
+            )
+
+    async def stop_builder(self):
+        if self._builder is not None:
+            self._builder.cancel()
+            try:
+                await self._builder
+            except asyncio.CancelledError:
+                pass
+            self._builder = None
+        if self._builder_lock is not None:
+            self._builder_lock.close()  # releases the flock
+            self._builder_lock = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._db.execute(
+                "SELECT kind, COUNT(*) FROM questions GROUP BY kind"
+            ).fetchall())
+            targets = self._db.execute("SELECT COUNT(*) FROM targets").fetchone()[0]
+        return {
+            "enabled": QUESTION_POOL,
+            "builder": self._builder_lock is not None,
+            "questions": counts,
+            "targets": targets,
+            "hits": self.hits,
+            "misses": self.misses,
+            "built": self.built,
+            "build_errors": self.build_errors,
+        }
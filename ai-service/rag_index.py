@@ -1,18 +1,138 @@
 ﻿from sentence_transformers import SentenceTransformer
 from pathlib import Path
-import numpy as np, json
+from kb_store import publish_dir, write_store, store_version
+from chunking import chunk_markdown
+import numpy as np, json, hashlib, fcntl, os, sys
 
-def chunks(t, n=800): return [t[i:i+n] for i in range(0, len(t), n)]
+MODEL = 'all-MiniLM-L6-v2'
+CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', 200))  # presupuesto por chunk (tokens estimados)
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 40))
+CHUNKER = f'md-{CHUNK_TOKENS}-{CHUNK_OVERLAP}'  # si cambia el chunker o el modelo, el manifest se invalida
+STORE = 'kb_store'  # lo que sirve el Retriever
+# caché float32 del build, publicada como una unidad (ver kb_store.publish_dir):
+#   kb_build -> kb_build.<versión>/{index.npz, docs.json, manifest.json}
+BUILD = 'kb_build'
+INDEX, DOCS, MANIFEST = 'index.npz', 'docs.json', 'manifest.json'
+# ficheros sueltos de versiones anteriores: se leen para no re-codificar todo al actualizar
+LEGACY = {INDEX: 'kb_index.npz', DOCS: 'kb_docs.json', MANIFEST: 'kb_manifest.json'}
+STORE_DTYPE = os.getenv('KB_STORE_DTYPE', 'float16')  # float32 | float16 | int8
+
+def chunks(t): return chunk_markdown(t, CHUNK_TOKENS, CHUNK_OVERLAP)
 def iter_docs(root='kb'):
     for p in Path(root).rglob('*.md'):
         txt = p.read_text(encoding='utf-8', errors='ignore')
         for i, c in enumerate(chunks(txt)):
-            yield {'text': c, 'source': str(p), 'i': i}
-
-print('Indexando KB...')
-enc = SentenceTransformer('all-MiniLM-L6-v2')
-docs = list(iter_docs('kb'))
-embs = enc.encode([d['text'] for d in docs], normalize_embeddings=True)
-np.savez('kb_index.npz', embs=embs)
-json.dump(docs, open('kb_docs.json','w',encoding='utf-8'), ensure_ascii=False, indent=2)
-print(f'Listo. Chunks: {len(docs)}')
+            yield {'text': c, 'source': str(p), 'i': i, 'collection': collection_of(p, root)}
+
+def sha(b: bytes) -> str: return hashlib.sha256(b).hexdigest()
+def collection_of(p: Path, root='kb') -> str:
+    """Primera carpeta bajo kb/ (banco_preguntas, rubricas, vacantes...); '' en la raíz."""
+    parts = p.relative_to(root).parts
+    return parts[0] if len(parts) > 1 else ''
+
+def chunk_keys(docs, hashes):
+    """Lo que identifica cada fila del almacén (texto, colección, origen): base de su versión."""
+    return [f"{h}:{d['collection']}:{d['source']}#{d['i']}" for d, h in zip(docs, hashes)]
+
+def load_previous():
+    """Manifest, docs y embeddings del índice anterior (o vacíos si no son reutilizables)."""
+    try:
+        root = Path(BUILD).resolve()  # los tres ficheros de la misma versión
+        path = (lambda f: root / f) if root.is_dir() else LEGACY.get
+        man = json.load(open(path(MANIFEST), encoding='utf-8'))
+        if man.get('model') != MODEL or man.get('chunker') != CHUNKER: raise ValueError('manifest obsoleto')
+        docs = json.load(open(path(DOCS), encoding='utf-8'))
+        embs = np.load(path(INDEX))['embs']
+        if not (len(docs) == len(embs) == len(man['chunks'])): raise ValueError('índice inconsistente')
+        return man, docs, embs
+    except Exception:
+        return {'files': {}, 'chunks': []}, [], None
+
+def migrate_legacy(store=STORE, log=print) -> bool:
+    """Crea `store` a partir de kb_index.npz + kb_docs.json (despliegues anteriores al almacén).
+
+    Sin re-codificar nada: los chunks se sirven tal cual hasta el próximo
+    reindex. Devuelve False si no hay ficheros que migrar. Un lock evita que
+    varios workers lo hagan a la vez.
+    """
+    if not (Path(LEGACY[INDEX]).exists() and Path(LEGACY[DOCS]).exists()): return False
+    with open(f'{store}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if Path(store).exists(): return True  # otro worker ya lo migró
+        docs = json.load(open(LEGACY[DOCS], encoding='utf-8'))
+        embs = np.asarray(np.load(LEGACY[INDEX])['embs'], dtype=np.float32)
+        if len(docs) != len(embs): raise ValueError('índice antiguo inconsistente')
+        for d in docs:
+            try: d.setdefault('collection', collection_of(Path(d['source'])))
+            except ValueError: d.setdefault('collection', '')
+        order = sorted(range(len(docs)), key=lambda r: docs[r]['collection'])  # colecciones contiguas
+        docs, embs = [docs[r] for r in order], embs[order]
+        hashes = [sha(d['text'].encode('utf-8')) for d in docs]
+        write_store(store, embs, docs, store_version(chunk_keys(docs, hashes), STORE_DTYPE), STORE_DTYPE)
+    log(f'Migrado {LEGACY[INDEX]} + {LEGACY[DOCS]} a {store}: {len(docs)} chunks')
+    return True
+
+def build_index(enc=None, root='kb', incremental=True, log=print, progress=None, batch=64):
+    """(Re)construye la caché del build (kb_build) y el almacén kb_store (con su índice IVF).
+
+    En modo incremental solo se re-codifican los chunks cuyo hash de texto no
+    estaba en el índice anterior; los ficheros sin cambios (mtime/tamaño) ni se
+    vuelven a leer y los ficheros borrados desaparecen del índice. `progress`,
+    si se da, recibe (hechos, total) a medida que se codifican los chunks.
+    """
+    man, old_docs, old_embs = load_previous() if incremental else ({'files': {}, 'chunks': []}, [], None)
+    by_source = {}
+    for d, h in zip(old_docs, man['chunks']): by_source.setdefault(d['source'], []).append((d, h))
+    old_rows = {h: r for r, h in enumerate(man['chunks'])}
+
+    files, docs, hashes = {}, [], []
+    # ordenados por colección: cada colección ocupa un rango contiguo de filas
+    for p in sorted(Path(root).rglob('*.md'), key=lambda p: (collection_of(p, root), str(p))):
+        src, st, col = str(p), p.stat(), collection_of(p, root)
+        prev = man['files'].get(src)
+        if prev and prev['mtime_ns'] == st.st_mtime_ns and prev['size'] == st.st_size and src in by_source:
+            files[src] = prev
+            for d, h in by_source[src]: docs.append({**d, 'collection': col}); hashes.append(h)
+            continue
+        raw = p.read_bytes()
+        files[src] = {'sha': sha(raw), 'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+        if prev and prev['sha'] == files[src]['sha'] and src in by_source:
+            for d, h in by_source[src]: docs.append({**d, 'collection': col}); hashes.append(h)
+            continue
+        txt = raw.decode('utf-8', errors='ignore')
+        for i, c in enumerate(chunks(txt)):
+            docs.append({'text': c, 'source': src, 'i': i, 'collection': col}); hashes.append(sha(c.encode('utf-8')))
+
+    todo = [j for j, h in enumerate(hashes) if h not in old_rows]
+    dim = old_embs.shape[1] if old_embs is not None else None
+    if todo:
+        enc = enc or SentenceTransformer(MODEL)
+        parts = []
+        for b in range(0, len(todo), batch):
+            parts.append(enc.encode([docs[j]['text'] for j in todo[b:b+batch]], normalize_embeddings=True))
+            if progress: progress(min(b + batch, len(todo)), len(todo))
+        new = np.concatenate(parts).astype(np.float32)
+        dim = new.shape[1]
+    embs = np.zeros((len(docs), dim or 0), dtype=np.float32)
+    reuse = [j for j, h in enumerate(hashes) if h in old_rows]
+    if reuse: embs[reuse] = old_embs[[old_rows[hashes[j]] for j in reuse]]
+    if todo: embs[todo] = new
+
+    write_store(STORE, embs, docs, store_version(chunk_keys(docs, hashes), STORE_DTYPE), STORE_DTYPE)
+    manifest = json.dumps({'model': MODEL, 'chunker': CHUNKER, 'files': files, 'chunks': hashes})
+
+    def fill(tmp: Path):
+        np.savez(tmp / INDEX, embs=embs)
+        (tmp / DOCS).write_text(json.dumps(docs, ensure_ascii=False, indent=2), encoding='utf-8')
+        (tmp / MANIFEST).write_text(manifest, encoding='utf-8')
+    publish_dir(BUILD, sha(manifest.encode('utf-8'))[:12], fill)
+
+    stats = {'chunks': len(docs), 'files': len(files), 'encoded': len(todo), 'reused': len(reuse),
+             'removed_files': len(set(man['files']) - set(files))}
+    log(f"Listo. Chunks: {stats['chunks']} (codificados {stats['encoded']}, reutilizados {stats['reused']}, "
+        f"ficheros eliminados {stats['removed_files']})")
+    return stats
+
+if __name__ == '__main__':
+    print('Indexando KB...')
+    build_index(incremental='--full' not in sys.argv[1:])
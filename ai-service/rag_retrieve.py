@@ -1,11 +1,136 @@
 ﻿from sentence_transformers import SentenceTransformer
-import numpy as np, json
+from ann_index import DEFAULT_NPROBE
+from kb_store import KBStore
+from rag_index import migrate_legacy
+from collections import OrderedDict
+import numpy as np, os, re, threading
+
+# nprobe: listas IVF a explorar por consulta (más = mejor recall, más latencia)
+RAG_NPROBE = int(os.getenv('RAG_NPROBE', DEFAULT_NPROBE))
+# por debajo de este nº de chunks la búsqueda exacta es más barata que el IVF
+RAG_ANN_MIN_CHUNKS = int(os.getenv('RAG_ANN_MIN_CHUNKS', 2048))
+# entradas de las cachés LRU (0 = desactivada)
+RAG_QUERY_CACHE = int(os.getenv('RAG_QUERY_CACHE', 1024))
+RAG_RESULT_CACHE = int(os.getenv('RAG_RESULT_CACHE', 256))
+# dense | lexical | hybrid (fusión RRF de ambos rankings)
+RAG_MODE = os.getenv('RAG_MODE', 'hybrid')
+RRF_K = 60
+
+class LRU:
+    def __init__(self, size):
+        self.size, self.hits, self.misses = size, 0, 0
+        self._d, self._lock = OrderedDict(), threading.Lock()
+    def get(self, key):
+        with self._lock:
+            if key in self._d:
+                self._d.move_to_end(key); self.hits += 1
+                return self._d[key]
+            self.misses += 1
+    def put(self, key, value):
+        if self.size <= 0: return
+        with self._lock:
+            self._d[key] = value; self._d.move_to_end(key)
+            while len(self._d) > self.size: self._d.popitem(last=False)
+    def stats(self):
+        return {'size': len(self._d), 'max': self.size, 'hits': self.hits, 'misses': self.misses}
+
+def norm_query(q: str) -> str: return re.sub(r'\s+', ' ', q).strip().lower()
+
 class Retriever:
-    def __init__(self, idx='kb_index.npz', meta='kb_docs.json'):
-        self.docs = json.load(open(meta, encoding='utf-8'))
-        self.embs = np.load(idx)['embs']
-        self.enc = SentenceTransformer('all-MiniLM-L6-v2')
-    def topk(self, query:str, k=6):
-        qv = self.enc.encode([query], normalize_embeddings=True)[0]
-        sims = self.embs @ qv
-        return [self.docs[i] for i in sims.argsort()[::-1][:k]]
+    def __init__(self, store='kb_store', enc=None, qcache=None):
+        if not os.path.exists(store): migrate_legacy(store)  # kb_index.npz + kb_docs.json de versiones anteriores
+        self.store = KBStore(store)
+        self.version = self.store.version
+        self.enc = enc or SentenceTransformer('all-MiniLM-L6-v2')  # reutiliza el encoder si ya está cargado
+        # el embedding de una consulta no depende del índice: la caché sobrevive a un reindex
+        self.qcache = qcache if qcache is not None else LRU(RAG_QUERY_CACHE)
+        self.rcache = LRU(RAG_RESULT_CACHE)  # resultados: claves con self.version
+        # el IVF vive dentro del directorio versionado del almacén: nunca se mezcla con otra versión
+        self.ann = self.store.ann if len(self.store) >= RAG_ANN_MIN_CHUNKS else None
+    def encode(self, queries):
+        """Embeddings normalizados; solo pasan por el modelo las consultas no cacheadas."""
+        keys = [norm_query(q) for q in queries]
+        out = [self.qcache.get(key) for key in keys]
+        miss = [j for j, v in enumerate(out) if v is None]
+        if miss:
+            vs = self.enc.encode([queries[j] for j in miss], normalize_embeddings=True)
+            for j, v in zip(miss, vs):
+                out[j] = v; self.qcache.put(keys[j], v)
+        return np.stack(out)
+    def topk(self, query:str, k=6, nprobe=None, mode=None, collection=None):
+        return self.topk_many([query], k, nprobe, mode, collection)[0]
+    def topk_mix(self, query:str, mix, nprobe=None, mode=None):
+        """Contexto equilibrado por colección, p. ej. {'rubricas': 3, 'banco_preguntas': 3}.
+
+        El resultado se intercala por rango (el 1º de cada colección, luego el
+        2º...), así que recortarlo por el final conserva lo mejor de cada una.
+        Si alguna colección no tiene chunks suficientes, se completa con el
+        top-k global sin repetir chunks.
+        """
+        per = [self.topk(query, n, nprobe, mode, collection=col) for col, n in mix.items()]
+        out = [hits[rank] for rank in range(max(mix.values(), default=0)) for hits in per if rank < len(hits)]
+        seen = {d['id'] for d in out}
+        total = sum(mix.values())
+        if len(out) < total:
+            for d in self.topk(query, total + len(out), nprobe, mode):
+                if len(out) == total: break
+                if d['id'] not in seen: out.append(d); seen.add(d['id'])
+        return out
+    def topk_many(self, queries, k=6, nprobe=None, mode=None, collection=None):
+        """Top-k para varias consultas: un solo encode y un solo producto matriz-matriz.
+
+        Con `collection` solo se puntúa el rango de filas de esa colección
+        (filtro previo, no posterior).
+        """
+        if not queries: return []
+        nprobe, mode = nprobe or RAG_NPROBE, mode or RAG_MODE
+        if self.store.bm25 is None: mode = 'dense'
+        lo, hi = self.store.rows(collection)
+        if hi <= lo: return [[] for _ in queries]
+        keys = [(self.version, norm_query(q), k, mode, collection, nprobe if self.ann is not None else None) for q in queries]
+        res = [self.rcache.get(key) for key in keys]
+        miss = [j for j, v in enumerate(res) if v is None]
+        if not miss: return [list(r) for r in res]
+        depth = k if mode == 'dense' else max(4 * k, 20)  # profundidad de cada ranking antes de fusionar
+        dense = self._dense([queries[j] for j in miss], depth, nprobe, lo, hi) if mode != 'lexical' else None
+        for n, j in enumerate(miss):
+            if mode == 'dense': ids = dense[n]
+            else:
+                lex = self.store.bm25.top(queries[j], depth, lo, hi)
+                ids = lex[:k] if mode == 'lexical' else rrf([dense[n], lex], k)
+            res[j] = [self.store.doc(i) for i in ids]; self.rcache.put(keys[j], res[j])
+        return [list(r) for r in res]
+    def _dense(self, queries, k, nprobe, lo, hi):
+        qvs = self.encode(queries)
+        if self.ann is None or hi - lo < RAG_ANN_MIN_CHUNKS:
+            return top_rows(self.store.scores(qvs, lo, hi), k) + lo  # (n_queries, hi - lo) por bloques
+        rows = []
+        for qv in qvs:
+            cand = self.ann.candidates(qv, nprobe)
+            cand = cand[(cand >= lo) & (cand < hi)]
+            if len(cand) < k:  # las listas exploradas apenas tocan la colección
+                rows.append(top_rows(self.store.scores(qv[None], lo, hi), k)[0] + lo); continue
+            rows.append(cand[top_rows((self.store.vectors(cand) @ qv)[None], k)[0]])
+        return rows
+    def vectors(self, docs):
+        """Embeddings (float32) de docs devueltos por topk, sin volver a codificar."""
+        return self.store.vectors(np.asarray([d['id'] for d in docs], dtype=np.int64))
+    def stats(self):
+        return {'version': self.version, 'chunks': len(self.store), 'dtype': self.store.dtype,
+                'ann': self.ann is not None, 'bm25': self.store.bm25 is not None,
+                'collections': {c: hi - lo for c, (lo, hi) in self.store.collections.items()}, 'query_cache': self.qcache.stats(), 'result_cache': self.rcache.stats()}
+
+def rrf(rankings, k):
+    """Reciprocal rank fusion: suma 1 / (RRF_K + rango) de cada ranking."""
+    fused = {}
+    for ranking in rankings:
+        for r, i in enumerate(ranking): fused[int(i)] = fused.get(int(i), 0.0) + 1.0 / (RRF_K + r + 1)
+    return sorted(fused, key=fused.get, reverse=True)[:k]
+
+def top_rows(sims, k):
+    """Índices top-k por fila (orden descendente) con argpartition, sin ordenar todo."""
+    k = min(k, sims.shape[1])
+    if k <= 0: return np.empty((sims.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(sims, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
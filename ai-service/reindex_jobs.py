@@ -0,0 +1,96 @@
+# ai-service/reindex_jobs.py
+
+import threading
+import time
+import logging
+from typing import Callable, Dict, Optional
+from uuid import uuid4
+
+from sentence_transformers import SentenceTransformer
+
+from rag_index import MODEL, build_index
+from rag_retrieve import Retriever
+
+logger = logging.getLogger(__name__)
+
+
+class ReindexJobs:
+    """Runs the KB reindex in a background thread inside this process.
+
+    The current Retriever's encoder is reused (no extra MiniLM copy) and the
+    new Retriever is handed to `on_ready`, which publishes it with a single
+    assignment, so in-flight requests keep using the previous snapshot.
+    Other workers load the new store version on their next request
+    (main._current_retriever).
+    With no current Retriever (no KB store yet) the job builds the first one.
+    Only one job runs at a time.
+    """
+
+    def __init__(self, on_ready: Callable[[Retriever], None], keep: int = 20):
+        self._on_ready = on_ready
+        self._keep = keep
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+        self._running: Optional[str] = None
+
+    def start(self, current: Optional[Retriever], incremental: bool = True) -> Dict:
+        with self._lock:
+            if self._running:
+                return dict(self._jobs[self._running])
+            job_id = str(uuid4())
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "running",
+                "stage": "queued",
+                "progress": 0.0,
+                "started_at": time.time(),
+                "finished_at": None,
+                "stats": None,
+                "error": None,
+            }
+            self._running = job_id
+            while len(self._jobs) > self._keep:
+                oldest = next(iter(self._jobs))
+                if oldest == job_id:
+                    break
+                del self._jobs[oldest]
+        enc = current.enc if current is not None else None
+        qcache = current.qcache if current is not None else None
+        threading.Thread(
+            target=self._run, args=(job_id, enc, qcache, incremental), daemon=True
+        ).start()
+        return dict(self._jobs[job_id])
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id: str, enc, qcache, incremental: bool):
+        try:
+            self._update(job_id, stage="indexing")
+            enc = enc or SentenceTransformer(MODEL)  # no retriever yet: load it once for both
+            stats = build_index(
+                enc=enc,
+                incremental=incremental,
+                log=logger.info,
+                progress=lambda done, total: self._update(
+                    job_id, progress=round(0.9 * done / max(total, 1), 3)
+                ),
+            )
+            self._update(job_id, stage="loading", progress=0.9, stats=stats)
+            new = Retriever(enc=enc, qcache=qcache)
+            self._on_ready(new)
+            self._update(job_id, status="done", stage="done", progress=1.0)
+            logger.info(f"✅ Reindex {job_id} finished: {stats}")
+        except Exception as e:
+            logger.error(f"Reindex {job_id} failed: {e}")
+            self._update(job_id, status="error", error=str(e))
+        finally:
+            self._update(job_id, finished_at=time.time())
+            with self._lock:
+                self._running = None
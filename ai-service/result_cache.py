@@ -0,0 +1,140 @@
+# ai-service/result_cache.py
+
+import os
+import re
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed cache for /generate_exam and /generate_interview results.
+# Key: sha256 of the normalized request (+ the KB version for endpoints that
+# retrieve context), so a reindex naturally invalidates exam results.
+#   - memory tier: LRU with TTL, per worker;
+#   - optional SQLite tier (GEN_CACHE_DB) shared by the workers on the host
+#     and surviving restarts; hits there are promoted to memory.
+# Async handlers use aget/aput, which run the SQLite tier in a worker thread.
+GEN_CACHE_SIZE = int(os.getenv("GEN_CACHE_SIZE", 512))
+GEN_CACHE_TTL = float(os.getenv("GEN_CACHE_TTL", 24 * 3600))  # seconds since stored
+GEN_CACHE_DB = os.getenv("GEN_CACHE_DB", "")  # empty: memory only
+GEN_CACHE_DB_MAX = int(os.getenv("GEN_CACHE_DB_MAX", 10_000))
+
+
+def _norm(v):
+    if isinstance(v, str):
+        return re.sub(r"\s+", " ", v).strip()
+    if isinstance(v, list):
+        return [_norm(x) for x in v]
+    if isinstance(v, dict):
+        return {k: _norm(x) for k, x in v.items()}
+    return v
+
+
+def cache_key(kind: str, request: Dict, kb_version: Optional[str] = None) -> str:
+    """Stable key for a generation request; whitespace differences don't matter."""
+    body = {"kind": kind, "request": _norm(request), "kb": kb_version}
+    raw = json.dumps(body, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, size: int = GEN_CACHE_SIZE, ttl: float = GEN_CACHE_TTL,
+                 db: str = GEN_CACHE_DB, db_max: int = GEN_CACHE_DB_MAX):
+        self.size, self.ttl, self.db_max = size, ttl, db_max
+        self._d: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "sqlite": 0}
+        self.misses = 0
+        self.evictions = {"ttl": 0, "lru": 0}
+        self._db = None
+        if db:
+            self._db = sqlite3.connect(db, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, data TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_stored_at ON results(stored_at)")
+            logger.info(f"Using SQLite generation cache at {db}")
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            item = self._d.get(key)
+            if item is not None:
+                if now - item[1] <= self.ttl:
+                    self._d.move_to_end(key)
+                    self.hits["memory"] += 1
+                    return item[0]
+                del self._d[key]
+                self.evictions["ttl"] += 1
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT data, stored_at FROM results WHERE key = ? AND stored_at >= ?",
+                    (key, now - self.ttl),
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits["sqlite"] += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Dict):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, data, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now),
+                )
+                self._db.execute("DELETE FROM results WHERE stored_at < ?", (now - self.ttl,))
+                self._db.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results"
+                    " ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (self.db_max,),
+                )
+
+    async def aget(self, key: str) -> Optional[Dict]:
+        if self._db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, value: Dict):
+        if self._db is None:
+            self.put(key, value)
+        else:
+            await asyncio.to_thread(self.put, key, value)
+
+    def _remember(self, key: str, value: Dict, stored_at: float):
+        if self.size <= 0:
+            return
+        self._d[key] = (value, stored_at)
+        self._d.move_to_end(key)
+        while len(self._d) > self.size:
+            self._d.popitem(last=False)
+            self.evictions["lru"] += 1
+
+    def stats(self) -> Dict:
+        out = {
+            "size": len(self._d),
+            "max": self.size,
+            "ttl": self.ttl,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "evictions": dict(self.evictions),
+        }
+        if self._db is not None:
+            with self._lock:
+                out["sqlite_size"] = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return out
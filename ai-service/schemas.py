@@ -0,0 +1,108 @@
+# ai-service/schemas.py
+
+import os
+from typing import Dict, Optional, Union
+
+# JSON schemas for Ollama structured outputs ("format" field). Ollama
+# constrains decoding to the schema, so the model cannot emit prose around the
+# JSON or drop required fields, and the "Corrige este JSON" round trip is only
+# needed for rules a schema cannot express (e.g. answer must be one of options).
+#   OLLAMA_FORMAT_MODE=schema  full JSON schema (Ollama >= 0.5)
+#   OLLAMA_FORMAT_MODE=json    plain JSON mode (older Ollama)
+#   OLLAMA_FORMAT_MODE=off     unconstrained, previous behaviour
+OLLAMA_FORMAT_MODE = os.getenv("OLLAMA_FORMAT_MODE", "schema")
+
+INTERVIEW_TYPES = ["technical", "behavioral", "situational"]
+
+
+def exam_question_schema() -> Dict:
+    return {
+        "type": "object",
+        "properties": {
+            "id": {"type": "string"},
+            "q": {"type": "string"},
+            "options": {
+                "type": "array",
+                "items": {"type": "string"},
+                "minItems": 4,
+                "maxItems": 4,
+            },
+            "answer": {"type": "string"},
+            "why": {"type": "string"},
+            "rubrics": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["id", "q", "options", "answer", "rubrics"],
+    }
+
+
+def exam_schema(n: int) -> Dict:
+    """Shape of build_exam_prompt's schema / what validate_exam checks."""
+    return {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "meta": {
+                "type": "object",
+                "properties": {"level": {"type": "string"}, "count": {"type": "integer"}},
+                "required": ["level", "count"],
+            },
+            "questions": {
+                "type": "array",
+                "minItems": n,
+                "items": exam_question_schema(),
+            },
+        },
+        "required": ["title", "meta", "questions"],
+    }
+
+
+def interview_question_schema() -> Dict:
+    return {
+        "type": "object",
+        "properties": {
+            "id": {"type": "string"},
+            "question": {"type": "string"},
+            "type": {"type": "string", "enum": INTERVIEW_TYPES},
+            "expected_keywords": {"type": "array", "items": {"type": "string"}},
+            "rubric": {"type": "string"},
+            "weight": {"type": "number"},
+        },
+        "required": ["id", "question", "type", "expected_keywords", "rubric", "weight"],
+    }
+
+
+def interview_schema(n: int) -> Dict:
+    """Shape of build_interview_prompt's schema."""
+    return {
+        "type": "object",
+        "properties": {
+            "vacancy": {"type": "string"},
+            "level": {"type": "string"},
+            "questions": {
+                "type": "array",
+                "minItems": n,
+                "items": interview_question_schema(),
+            },
+        },
+        "required": ["vacancy", "level", "questions"],
+    }
+
+
+def questions_schema(item: Dict, n: int) -> Dict:
+    """{"questions": [...]} with exactly n items (replacement questions)."""
+    return {
+        "type": "object",
+        "properties": {
+            "questions": {"type": "array", "minItems": n, "maxItems": n, "items": item},
+        },
+        "required": ["questions"],
+    }
+
+
+def ollama_format(schema: Dict) -> Optional[Union[str, Dict]]:
+    """Value for Ollama's "format" field according to OLLAMA_FORMAT_MODE."""
+    if OLLAMA_FORMAT_MODE == "schema":
+        return schema
+    if OLLAMA_FORMAT_MODE == "json":
+        return "json"
+    return None
@@ -0,0 +1,268 @@
+# ai-service/session_store.py
+
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Chat sessions: {"system": str | None, "history": [[user, assistant], ...]}
+# plus the rolling summary written by chat_history.compact ("summary",
+# "summarized"). Async handlers use aget/aput/afold: the SQLite store runs
+# them in a worker thread so disk I/O never blocks the event loop.
+# A chat turn reads the session, waits for the LLM and writes it back; a
+# compaction finishing meanwhile must not be undone by that stale copy, so
+# the summary is written with fold() and put() keeps a stored summary that
+# is further ahead than the one it is given.
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # memory | sqlite
+SESSION_DB = os.getenv("SESSION_DB", "sessions.db")
+SESSION_TTL = float(os.getenv("SESSION_TTL", 6 * 3600))  # seconds since last access
+SESSION_MAX = int(os.getenv("SESSION_MAX", 10_000))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def _merge_summary(session: Dict, summary: Optional[str], summarized: Optional[int]):
+    if (summarized or 0) > session.get("summarized", 0):
+        session["summary"], session["summarized"] = summary, summarized
+
+
+class MemorySessionStore:
+    """In-process store with TTL + LRU eviction and a memory cap.
+
+    Sizes are the JSON-encoded length of each session, which is also what
+    the SQLite store keeps on disk. Only valid for a single worker.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = SESSION_MAX,
+                 max_bytes: int = SESSION_MAX_BYTES):
+        self.ttl, self.max_sessions, self.max_bytes = ttl, max_sessions, max_bytes
+        self._d: "OrderedDict[str, tuple]" = OrderedDict()  # sid -> (session, size, last_access)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.evictions = {"ttl": 0, "lru": 0, "memory": 0}
+
+    def get(self, sid: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._d.get(sid)
+            if item is None or time.time() - item[2] > self.ttl:
+                if item is not None:
+                    self._drop(sid, "ttl")
+                self.misses += 1
+                return None
+            session, size, _ = item
+            self._d[sid] = (session, size, time.time())
+            self._d.move_to_end(sid)
+            self.hits += 1
+            return session
+
+    def put(self, sid: str, session: Dict):
+        with self._lock:
+            if sid in self._d:
+                stored = self._d[sid][0]
+                _merge_summary(session, stored.get("summary"), stored.get("summarized"))
+                self._bytes -= self._d[sid][1]
+            size = len(json.dumps(session, ensure_ascii=False))
+            self._d[sid] = (session, size, time.time())
+            self._d.move_to_end(sid)
+            self._bytes += size
+            self._evict()
+
+    def fold(self, sid: str, start: int, end: int, summary: str) -> bool:
+        """Set the summary of turns [0, end) if the session is still summarized up to `start`."""
+        with self._lock:
+            item = self._d.get(sid)
+            if item is None or item[0].get("summarized", 0) != start:
+                return False
+            session, size, last = item
+            session["summary"], session["summarized"] = summary, end
+            new_size = len(json.dumps(session, ensure_ascii=False))
+            self._d[sid] = (session, new_size, last)
+            self._bytes += new_size - size
+            self._evict()
+            return True
+
+    def delete(self, sid: str):
+        with self._lock:
+            if sid in self._d:
+                self._bytes -= self._d.pop(sid)[1]
+
+    async def aget(self, sid: str) -> Optional[Dict]:
+        return self.get(sid)  # no I/O, nothing to offload
+
+    async def aput(self, sid: str, session: Dict):
+        self.put(sid, session)
+
+    async def afold(self, sid: str, start: int, end: int, summary: str) -> bool:
+        return self.fold(sid, start, end, summary)
+
+    def __contains__(self, sid: str) -> bool:
+        return self.get(sid) is not None
+
+    def _drop(self, sid: str, reason: str):
+        self._bytes -= self._d.pop(sid)[1]
+        self.evictions[reason] += 1
+
+    def _evict(self):
+        now = time.time()
+        # entries are in access order: expired ones are at the front
+        while self._d:
+            sid, (_, _, last) = next(iter(self._d.items()))
+            if now - last <= self.ttl:
+                break
+            self._drop(sid, "ttl")
+        while len(self._d) > self.max_sessions:
+            self._drop(next(iter(self._d)), "lru")
+        while self._bytes > self.max_bytes and len(self._d) > 1:
+            self._drop(next(iter(self._d)), "memory")
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "memory",
+            "size": len(self._d),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": dict(self.evictions),
+        }
+
+
+class SQLiteSessionStore:
+    """SQLite-backed store shared by every worker process on the host.
+
+    WAL mode lets workers read while another one writes. TTL and LRU use a
+    last-access timestamp column; the memory cap applies to the summed size
+    of the stored sessions. Counters are per process.
+    """
+
+    def __init__(self, path: str = SESSION_DB, ttl: float = SESSION_TTL,
+                 max_sessions: int = SESSION_MAX, max_bytes: int = SESSION_MAX_BYTES):
+        self.ttl, self.max_sessions, self.max_bytes = ttl, max_sessions, max_bytes
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, data TEXT NOT NULL,"
+            " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions(last_access)")
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.evictions = {"ttl": 0, "lru": 0, "memory": 0}
+
+    def get(self, sid: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, last_access FROM sessions WHERE id = ?", (sid,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+                    self.evictions["ttl"] += 1
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE sessions SET last_access = ? WHERE id = ?", (now, sid))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, sid: str, session: Dict):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT json_extract(data, '$.summary'), json_extract(data, '$.summarized')"
+                " FROM sessions WHERE id = ?", (sid,)
+            ).fetchone()
+            if row is not None:
+                _merge_summary(session, *row)
+            data = json.dumps(session, ensure_ascii=False)
+            self._db.execute(
+                "INSERT INTO sessions (id, data, size, last_access) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET data = excluded.data,"
+                " size = excluded.size, last_access = excluded.last_access",
+                (sid, data, len(data), time.time()),
+            )
+            self._evict()
+
+    def fold(self, sid: str, start: int, end: int, summary: str) -> bool:
+        """Set the summary of turns [0, end) if the session is still summarized up to `start`."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE sessions SET data = json_set(data, '$.summary', ?, '$.summarized', ?)"
+                " WHERE id = ? AND COALESCE(json_extract(data, '$.summarized'), 0) = ?",
+                (summary, end, sid, start),
+            )
+            if cur.rowcount:
+                self._db.execute("UPDATE sessions SET size = length(data) WHERE id = ?", (sid,))
+            return cur.rowcount > 0
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    async def aget(self, sid: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.get, sid)
+
+    async def aput(self, sid: str, session: Dict):
+        await asyncio.to_thread(self.put, sid, session)
+
+    async def afold(self, sid: str, start: int, end: int, summary: str) -> bool:
+        return await asyncio.to_thread(self.fold, sid, start, end, summary)
+
+    def __contains__(self, sid: str) -> bool:
+        return self.get(sid) is not None
+
+    def _evict(self):
+        cur = self._db.execute(
+            "DELETE FROM sessions WHERE last_access < ?", (time.time() - self.ttl,)
+        )
+        self.evictions["ttl"] += cur.rowcount
+        count, total = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions"
+        ).fetchone()
+        if count > self.max_sessions:
+            cur = self._db.execute(
+                "DELETE FROM sessions WHERE id IN"
+                " (SELECT id FROM sessions ORDER BY last_access LIMIT ?)",
+                (count - self.max_sessions,),
+            )
+            self.evictions["lru"] += cur.rowcount
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions"
+            ).fetchone()
+        while total > self.max_bytes:
+            row = self._db.execute(
+                "SELECT id, size FROM sessions ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            if row is None or count <= 1:
+                break
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (row[0],))
+            total, count = total - row[1], count - 1
+            self.evictions["memory"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "size": count,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": dict(self.evictions),
+        }
+
+
+def make_session_store():
+    if SESSION_STORE == "sqlite":
+        logger.info(f"Using SQLite session store at {SESSION_DB}")
+        return SQLiteSessionStore()
+    return MemorySessionStore()
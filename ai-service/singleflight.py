@@ -0,0 +1,52 @@
+# ai-service/singleflight.py
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key starts `fn()` as a task; callers arriving
+    while it runs await the same task and get its result (or exception).
+    The task is shielded, so a client that disconnects doesn't cancel the
+    generation the other callers are waiting for. Only in-flight calls are
+    shared: once the task finishes the key is forgotten (finished results
+    are the result cache's job).
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.calls = 0      # executions actually started
+        self.coalesced = 0  # callers served by someone else's execution
+        self.errors = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """Return (result, shared); `shared` is True if another caller ran fn."""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = asyncio.get_running_loop().create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task), shared
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> Dict:
+        return {
+            "inflight": len(self._inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
@@ -0,0 +1,7 @@
+# ai-service/tests/conftest.py
+
+import sys
+from pathlib import Path
+
+# los módulos del servicio viven sueltos en ai-service/, no en un paquete
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
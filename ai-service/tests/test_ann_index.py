@@ -0,0 +1,72 @@
+# ai-service/tests/test_ann_index.py
+
+import numpy as np
+
+from ann_index import IVFIndex, _top
+
+
+def _embs(n, d=16, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def test_top_orders_and_clamps_k():
+    s = np.array([0.1, 0.9, 0.5, 0.7], np.float32)
+    assert _top(s, 2).tolist() == [1, 3]
+    assert _top(s, 10).tolist() == [1, 3, 2, 0]
+    assert _top(s, 0).size == 0
+
+
+def test_build_partitions_every_vector_once():
+    embs = _embs(500)
+    idx = IVFIndex.build(embs)
+    assert idx.nlist == int(np.sqrt(500))
+    assert idx.size == 500
+    assert sorted(idx.list_ids.tolist()) == list(range(500))
+    assert idx.list_ptr[0] == 0 and idx.list_ptr[-1] == 500
+    assert np.allclose(np.linalg.norm(idx.centroids, axis=1), 1, atol=1e-5)
+
+
+def test_full_probe_matches_exact_search():
+    embs = _embs(400)
+    idx = IVFIndex.build(embs, nlist=10)
+    qv = embs[7]
+    ids, scores = idx.search(embs, qv, k=5, nprobe=idx.nlist)
+    exact = np.argsort(-(embs @ qv))[:5]
+    assert ids.tolist() == exact.tolist()
+    assert ids[0] == 7
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_partial_probe_only_scores_candidates():
+    embs = _embs(400)
+    idx = IVFIndex.build(embs, nlist=10)
+    cand = idx.candidates(embs[0], nprobe=2)
+    assert 0 < len(cand) < 400
+    assert 0 in cand
+
+
+def test_fewer_vectors_than_lists():
+    embs = _embs(3)
+    idx = IVFIndex.build(embs, nlist=8)
+    assert idx.nlist == 3
+    ids, _ = idx.search(embs, embs[2], k=3, nprobe=3)
+    assert ids[0] == 2
+
+
+def test_empty_index():
+    idx = IVFIndex.build(np.zeros((0, 16), np.float32))
+    assert idx.nlist == 0 and idx.size == 0
+    ids, scores = idx.search(np.zeros((0, 16), np.float32), _embs(1)[0], k=5)
+    assert ids.size == 0 and scores.size == 0
+
+
+def test_save_load_roundtrip(tmp_path):
+    embs = _embs(100)
+    idx = IVFIndex.build(embs, nlist=5)
+    idx.save(tmp_path)
+    back = IVFIndex.load(tmp_path)
+    assert isinstance(back.list_ids, np.memmap)
+    assert np.array_equal(back.centroids, idx.centroids)
+    assert np.array_equal(back.list_ptr, idx.list_ptr)
+    assert np.array_equal(back.list_ids, idx.list_ids)
@@ -0,0 +1,54 @@
+# ai-service/tests/test_bm25.py
+
+import numpy as np
+
+from bm25 import BM25Index, tokenize
+
+TEXTS = [
+    'Node.js usa un bucle de eventos',
+    'En C# las clases pueden ser parciales',
+    'El bucle for recorre una lista; otro bucle while',
+    'Las consultas SQL usan JOIN',
+]
+
+
+def test_tokenize_keeps_technical_terms():
+    assert tokenize('Node.js y C# o C++') == ['node.js', 'c#', 'c++']
+    assert tokenize('Canción ÁRBOL') == ['cancion', 'arbol']
+    assert tokenize('la de el') == []
+
+
+def test_scores_only_matching_chunks():
+    idx = BM25Index.build(TEXTS)
+    ids, scores = idx.scores('bucle')
+    assert ids.tolist() == [0, 2]
+    assert np.all(scores > 0)
+    # dos apariciones en un chunk de longitud parecida pesan más
+    assert scores[1] > scores[0]
+
+
+def test_top_ranks_and_limits():
+    idx = BM25Index.build(TEXTS)
+    assert idx.top('bucle eventos', 1).tolist() == [0]
+    assert idx.top('bucle eventos', 5).tolist()[:1] == [0]
+    assert idx.top('inexistente', 5).size == 0
+
+
+def test_row_range():
+    idx = BM25Index.build(TEXTS)
+    assert idx.top('bucle', 5, lo=1).tolist() == [2]
+    assert idx.top('bucle', 5, hi=2).tolist() == [0]
+    assert idx.top('bucle', 5, lo=1, hi=2).size == 0
+
+
+def test_empty_corpus():
+    idx = BM25Index.build([])
+    assert idx.count == 0 and idx.top('bucle', 3).size == 0
+
+
+def test_save_load_roundtrip(tmp_path):
+    idx = BM25Index.build(TEXTS)
+    idx.save(tmp_path)
+    back = BM25Index.load(tmp_path, len(TEXTS))
+    a, b = idx.scores('bucle join c#'), back.scores('bucle join c#')
+    assert np.array_equal(a[0], b[0]) and np.allclose(a[1], b[1])
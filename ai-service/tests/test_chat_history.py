@@ -0,0 +1,118 @@
+# ai-service/tests/test_chat_history.py
+
+import asyncio
+
+import pytest
+
+import chat_history
+from chat_history import PromptTooLong, build_messages, compact
+from chunking import count_tokens
+from session_store import MemorySessionStore, SQLiteSessionStore
+
+
+def _session(turns):
+    return {"system": "Eres un entrevistador.", "history": [[f"respuesta {i}", f"pregunta {i}"] for i in range(turns)]}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionStore()
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"))
+
+
+def test_compaction_survives_a_concurrent_turn(store, monkeypatch):
+    monkeypatch.setattr(chat_history, "CHAT_KEEP_TURNS", 2)
+    monkeypatch.setattr(chat_history, "CHAT_FOLD_BATCH", 2)
+
+    async def llm(prompt, model):
+        await asyncio.sleep(0.2)
+        return "resumen"
+
+    async def turn(sid):
+        # lo que hace /chat/message: leer, esperar al LLM, escribir su copia
+        session = await store.aget(sid)
+        reply = await llm("", "m")
+        session["history"].append(["otra respuesta", reply])
+        await store.aput(sid, session)
+
+    async def run():
+        await store.aput("s", _session(6))
+        task = asyncio.create_task(compact("s", store, llm, "m"))
+        await asyncio.sleep(0.05)  # la compactación ya tiene su copia
+        await turn("s")
+        await task
+        return await store.aget("s")
+
+    before = chat_history.STATS["compactions"]
+    session = asyncio.run(run())
+    assert chat_history.STATS["compactions"] == before + 1
+    assert session["summary"] == "resumen" and session["summarized"] == 4
+    assert len(session["history"]) == 7
+
+
+def test_stale_fold_is_discarded(store):
+    async def run():
+        await store.aput("s", _session(8))
+        assert await store.afold("s", 0, 4, "primero")
+        assert not await store.afold("s", 0, 2, "tarde")
+        return await store.aget("s")
+
+    session = asyncio.run(run())
+    assert session["summary"] == "primero" and session["summarized"] == 4
+
+
+def _tokens(messages):
+    return sum(count_tokens(m["content"]) for m in messages)
+
+
+@pytest.fixture
+def ceiling(monkeypatch):
+    monkeypatch.setattr(chat_history, "CHAT_MAX_PROMPT_TOKENS", 200)
+    monkeypatch.setattr(chat_history, "STATS", dict.fromkeys(chat_history.STATS, 0))
+    return 200
+
+
+def test_build_messages_keeps_the_prompt_under_the_ceiling(ceiling):
+    session = {"system": "Eres un entrevistador.",
+               "history": [[f"respuesta larga número {i} " * 3, f"pregunta {i} " * 3] for i in range(20)]}
+    for text in ("corta", "palabra " * 40, "palabra " * 500):
+        messages = build_messages(session, text)
+        assert _tokens(messages) <= ceiling
+        assert messages[0]["role"] == "system" and messages[-1]["role"] == "user"
+    # un mensaje que no cabe ni sin historial se recorta
+    assert len(messages) == 2 and chat_history.STATS["inputs_truncated"] == 1
+    # si cabe, se conservan los turnos más recientes
+    messages = build_messages(session, "palabra " * 40)
+    assert messages[-2]["content"] == session["history"][-1][1]
+    assert messages[1]["content"] != session["history"][0][0]
+
+
+def test_dropped_turns_are_counted_once(ceiling):
+    session = {"system": None,
+               "history": [[f"respuesta {i} " * 10, f"pregunta {i} " * 10] for i in range(20)]}
+    build_messages(session, "hola")
+    dropped = chat_history.STATS["turns_dropped"]
+    assert dropped > 0
+    build_messages(session, "hola")
+    assert chat_history.STATS["turns_dropped"] == dropped
+    session["history"].append(["respuesta 20 " * 10, "pregunta 20 " * 10])
+    build_messages(session, "hola")
+    assert chat_history.STATS["turns_dropped"] == dropped + 1
+    # tras un resumen, los turnos plegados ya no cuentan como perdidos
+    session["summary"], session["summarized"] = "resumen", 15
+    build_messages(session, "hola")
+    assert chat_history.STATS["turns_dropped"] == dropped + 1
+
+
+def test_summary_and_recent_turns_go_in_order(ceiling):
+    session = {"system": "S", "summary": "R", "summarized": 2,
+               "history": [["a", "b"], ["c", "d"], ["e", "f"]]}
+    messages = build_messages(session, "g")
+    assert [m["content"] for m in messages] == [
+        "S", "Resumen de la entrevista hasta ahora:\nR", "e", "f", "g"]
+
+
+def test_system_prompt_over_the_ceiling_is_rejected(ceiling):
+    with pytest.raises(PromptTooLong):
+        build_messages({"system": "palabra " * 500, "history": []}, "hola")
@@ -0,0 +1,83 @@
+# ai-service/tests/test_chunking.py
+
+from chunking import chunk_markdown, count_tokens, sections, split_long
+
+DOC = '''---
+title: Python
+---
+# Python
+
+## Listas
+
+Una lista es mutable. Se crea con corchetes. Admite elementos de cualquier tipo.
+
+- append añade al final
+- pop quita el último
+
+## Diccionarios
+
+Un diccionario asocia claves y valores.
+'''
+
+
+def _long_section(n=60):
+    return '# Tema\n\n## Sub\n\n' + ' '.join(f'Frase número {i} sobre el tema.' for i in range(n)) + '\n'
+
+
+def test_sections_track_heading_path_and_frontmatter():
+    out = sections(DOC)
+    assert out[0] == ([], ['---', 'title: Python', '---'])
+    paths = [p for p, _ in out[1:]]
+    assert paths == [['# Python', '## Listas'], ['# Python', '## Diccionarios']]
+    units = out[1][1]
+    assert units[:3] == ['Una lista es mutable.', 'Se crea con corchetes.',
+                         'Admite elementos de cualquier tipo.']
+    assert units[3:] == ['- append añade al final', '- pop quita el último']
+
+
+def test_small_sections_are_grouped():
+    chunks = chunk_markdown(DOC, max_tokens=200)
+    assert len(chunks) == 1
+    assert '## Listas' in chunks[0] and '## Diccionarios' in chunks[0]
+
+
+def test_chunks_respect_budget_and_start_with_heading():
+    for max_tokens, overlap in ((60, 20), (80, 40), (40, 30)):
+        chunks = chunk_markdown(_long_section(), max_tokens, overlap)
+        assert len(chunks) > 1
+        for c in chunks:
+            assert c.startswith('# Tema\n## Sub')
+            assert count_tokens(c) <= max_tokens, (max_tokens, overlap, c)
+
+
+def test_overlap_carries_whole_sentences():
+    chunks = chunk_markdown(_long_section(), max_tokens=80, overlap=20)
+    for prev, nxt in zip(chunks, chunks[1:]):
+        first = nxt.split('\n')[2]
+        assert first in prev.split('\n')
+        assert first.endswith('.')
+
+
+def test_no_overlap():
+    chunks = chunk_markdown(_long_section(), max_tokens=80, overlap=0)
+    bodies = [set(c.split('\n')[2:]) for c in chunks]
+    assert all(not (a & b) for a, b in zip(bodies, bodies[1:]))
+
+
+def test_split_long_by_words():
+    unit = ' '.join(['palabra'] * 50)
+    parts = split_long(unit, 10)
+    assert ' '.join(parts) == unit
+    assert all(count_tokens(p) <= 10 for p in parts)
+
+
+def test_oversized_unit_is_split():
+    text = '# T\n\n' + ' '.join(['palabra'] * 300) + '\n'
+    chunks = chunk_markdown(text, max_tokens=50, overlap=10)
+    assert all(count_tokens(c) <= 50 for c in chunks)
+    assert sum(c.count('palabra') for c in chunks) >= 300
+
+
+def test_bom_and_empty_input():
+    assert chunk_markdown('') == []
+    assert chunk_markdown('﻿# T\n\nHola.') == ['# T\nHola.']
@@ -0,0 +1,88 @@
+# ai-service/tests/test_circuit_breaker.py
+
+import pytest
+
+import circuit_breaker as cb
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cb.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(cb, "LLM_CB_FAILURES", 3)
+    monkeypatch.setattr(cb, "LLM_CB_SLOW_CALL", 10.0)
+    monkeypatch.setattr(cb, "LLM_CB_SLOW_CALLS", 2)
+    monkeypatch.setattr(cb, "LLM_CB_OPEN_SECONDS", 15.0)
+    monkeypatch.setattr(cb, "LLM_CB_OPEN_MAX", 40.0)
+    monkeypatch.setattr(cb, "LLM_CB_HALF_OPEN_CALLS", 1)
+    return now
+
+
+def test_consecutive_failures_open(clock):
+    b = CircuitBreaker("ollama-1")
+    b.record(False, 1.0); b.record(False, 1.0)
+    b.record(True, 1.0)  # un éxito reinicia la cuenta
+    b.record(False, 1.0); b.record(False, 1.0)
+    assert b.state == CLOSED
+    b.record(False, 1.0)
+    assert b.state == OPEN and not b.allow()
+    assert b.retry_after() == 15
+    assert b.stats()["opened"] == 1 and b.stats()["failures"] == 5
+
+
+def test_slow_calls_open(clock):
+    b = CircuitBreaker("ollama-1")
+    b.record(True, 11.0)
+    assert b.state == CLOSED
+    b.record(True, 12.0)
+    assert b.state == OPEN
+    assert b.counts["slow_calls"] == 2
+
+
+def test_unknown_duration_is_not_slow(clock):
+    b = CircuitBreaker("ollama-1")
+    for _ in range(5):
+        b.record(True, None)
+    assert b.state == CLOSED and b.counts["slow_calls"] == 0
+
+
+def test_half_open_trial(clock):
+    b = CircuitBreaker("ollama-1")
+    b.trip("test")
+    clock[0] += 15
+    assert b.allow() and b.state == HALF_OPEN
+    b.begin()
+    assert not b.allow()  # solo una llamada de prueba a la vez
+    b.abandon()
+    assert b.allow()
+    b.begin()
+    b.record(True, 1.0)
+    assert b.state == CLOSED and b.opens == 0
+
+
+def test_failed_trial_reopens_longer_up_to_max(clock):
+    b = CircuitBreaker("ollama-1")
+    b.trip("test")
+    for expected in (30, 40, 40):
+        clock[0] += 60
+        b.begin()
+        b.record(False, None)
+        assert b.state == OPEN
+        assert b.retry_after() == expected
+
+
+def test_late_results_while_open_are_ignored(clock):
+    b = CircuitBreaker("ollama-1")
+    b.trip("test")
+    b.record(True, 1.0)
+    assert b.state == OPEN
+
+
+def test_probe_only_moves_open_to_half_open(clock):
+    b = CircuitBreaker("ollama-1")
+    b.probe_ok()
+    assert b.state == CLOSED
+    b.trip("test")
+    b.probe_ok()
+    assert b.state == HALF_OPEN and b.allow()
@@ -0,0 +1,63 @@
+# ai-service/tests/test_json_stream.py
+
+import json
+
+import pytest
+
+from json_stream import ArrayItemStream
+
+DOC = {
+    "title": "Entrevista {backend}",
+    "meta": {"questions": [{"id": "no"}]},
+    "questions": [
+        {"id": 1, "text": "¿Qué es un \"closure\"?", "tags": ["js", "[scope]"]},
+        {"id": 2, "text": "Explica } y ] dentro de un string", "extra": {"a": [1, 2]}},
+        {"id": 3, "text": "barra \\ invertida"},
+    ],
+    "notes": "fin",
+}
+
+
+def _feed_in(text, size):
+    s, items = ArrayItemStream(), []
+    for i in range(0, len(text), size):
+        items.extend(s.feed(text[i:i + size]))
+    return s, items
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_items_match_document_for_any_chunking(size):
+    text = "Aquí tienes:\n" + json.dumps(DOC, ensure_ascii=False, indent=2)
+    s, items = _feed_in(text, size)
+    assert items == DOC["questions"]
+    assert s.count == 3 and s.array_closed and s.closed
+    assert s.document() == DOC
+
+
+def test_items_arrive_as_soon_as_they_close():
+    s = ArrayItemStream()
+    assert s.feed('{"questions": [{"id": 1}') == [{"id": 1}]
+    assert s.feed(', {"id": ') == []
+    assert not s.array_closed
+    assert s.feed('2}]') == [{"id": 2}]
+    assert s.array_closed and not s.closed
+    s.feed("}")
+    assert s.closed
+
+
+def test_other_keys_are_ignored():
+    s = ArrayItemStream("items")
+    assert s.feed('{"questions": [{"id": 1}], "items": [{"id": 2}]}') == [{"id": 2}]
+
+
+def test_unbalanced_input_raises():
+    s = ArrayItemStream()
+    with pytest.raises(ValueError):
+        s.feed('{"questions": [}')
+
+
+def test_document_without_json():
+    s = ArrayItemStream()
+    s.feed("no puedo generar eso")
+    with pytest.raises(ValueError):
+        s.document()
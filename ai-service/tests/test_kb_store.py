@@ -0,0 +1,114 @@
+# ai-service/tests/test_kb_store.py
+
+import os
+import numpy as np
+import pytest
+
+from kb_store import KBStore, linked_version, publish_dir, quantize, store_version, write_store
+
+
+def _embs(n, d=8, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+DOCS = [
+    {'text': 'Python usa indentación', 'source': 'kb/python/a.md', 'i': 0, 'collection': 'python'},
+    {'text': 'listas y diccionarios', 'source': 'kb/python/a.md', 'i': 1, 'collection': 'python'},
+    {'text': 'SELECT con JOIN', 'source': 'kb/sql/b.md', 'i': 0, 'collection': 'sql'},
+]
+
+
+def test_store_version_depends_on_content_and_dtype():
+    assert store_version(['a', 'b'], 'float16') == store_version(['a', 'b'], 'float16')
+    assert store_version(['a', 'b'], 'float16') != store_version(['a', 'c'], 'float16')
+    assert store_version(['a', 'b'], 'float16') != store_version(['a', 'b'], 'int8')
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'float16', 'int8'])
+def test_roundtrip(tmp_path, dtype):
+    embs = _embs(3)
+    path = str(tmp_path / 'kb_store')
+    write_store(path, embs, DOCS, 'abc123', dtype)
+    store = KBStore(path)
+    assert len(store) == 3 and store.version == 'abc123'
+    assert store.doc(1) == {**DOCS[1], 'id': 1}
+    assert store.rows('sql') == (2, 3) and store.rows('go') == (0, 0)
+    assert np.allclose(store.vectors([0, 2]), embs[[0, 2]], atol=2e-2)
+    assert np.allclose(store.scores(embs[:1]), embs[:1] @ embs.T, atol=2e-2)
+    assert store.bm25.top('join', 3).tolist() == [2]
+    assert isinstance(store.ann.list_ids, np.memmap)
+
+
+def test_int8_scales():
+    q, scales = quantize(_embs(4), 'int8')
+    assert q.dtype == np.int8 and scales.shape == (4,)
+    assert np.abs(q).max() == 127
+    with pytest.raises(ValueError):
+        quantize(_embs(1), 'bfloat16')
+
+
+def test_collections_must_be_contiguous(tmp_path):
+    docs = [DOCS[0], DOCS[2], DOCS[1]]
+    with pytest.raises(ValueError):
+        write_store(str(tmp_path / 'kb_store'), _embs(3), docs, 'v1')
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / 'kb_store')
+    write_store(path, np.zeros((0, 8), np.float32), [], 'e0')
+    store = KBStore(path)
+    assert len(store) == 0 and store.scores(_embs(1)).shape == (1, 0)
+
+
+def test_publish_keeps_current_and_previous(tmp_path):
+    link = tmp_path / 'kb_build'
+    calls = []
+
+    def fill(name):
+        def f(tmp):
+            calls.append(name)
+            (tmp / 'x').write_text(name)
+        return f
+
+    for v in ('a1', 'b2', 'c3'):
+        publish_dir(str(link), v, fill(v))
+    assert os.readlink(link) == 'kb_build.c3'
+    assert (link / 'x').read_text() == 'c3'
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['kb_build', 'kb_build.b2', 'kb_build.c3']
+
+    # una versión ya publicada se reutiliza sin volver a escribirla
+    publish_dir(str(link), 'b2', fill('b2'))
+    assert calls == ['a1', 'b2', 'c3']
+    assert os.readlink(link) == 'kb_build.b2'
+
+
+def test_publish_leaves_other_writers_alone(tmp_path):
+    link = tmp_path / 'kb_build'
+    other = tmp_path / f'kb_build.d4.tmp.{os.getpid() + 1}'
+    other.mkdir()
+    publish_dir(str(link), 'a1', lambda tmp: None)
+    publish_dir(str(link), 'b2', lambda tmp: None)
+    assert other.is_dir()
+
+
+def test_failed_fill_does_not_publish(tmp_path):
+    link = tmp_path / 'kb_build'
+    publish_dir(str(link), 'a1', lambda tmp: None)
+
+    def boom(tmp):
+        raise RuntimeError('disco lleno')
+
+    with pytest.raises(RuntimeError):
+        publish_dir(str(link), 'b2', boom)
+    assert os.readlink(link) == 'kb_build.a1'
+    assert not (tmp_path / 'kb_build.b2').exists()
+
+
+def test_linked_version_follows_the_symlink(tmp_path):
+    path = str(tmp_path / 'kb_store')
+    assert linked_version(path) is None
+    write_store(path, _embs(3), DOCS, 'a1b2c3')
+    assert linked_version(path) == KBStore(path).version == 'a1b2c3'
+    write_store(path, _embs(3, seed=1), DOCS, 'd4e5f6')
+    assert linked_version(path) == 'd4e5f6'
@@ -0,0 +1,125 @@
+# ai-service/tests/test_llm_scheduler.py
+
+import asyncio
+
+import pytest
+
+from llm_scheduler import LLMScheduler, QueueFull, llm_priority
+
+WEIGHTS = {"interactive": 4, "batch": 1}
+QUEUES = {"interactive": 8, "batch": 8}
+
+
+def _scheduler(n=2, reserved=1, weights=WEIGHTS, queue_max=QUEUES):
+    return LLMScheduler(max_concurrency=n, reserved=reserved, weights=weights, queue_max=queue_max)
+
+
+async def _hold(s, p, until, order=None):
+    async with s.slot(p):
+        if order is not None:
+            order.append(p)
+        await until.wait()
+
+
+def test_concurrency_limit():
+    async def run():
+        s, done = _scheduler(n=2, reserved=0), asyncio.Event()
+        tasks = [asyncio.create_task(_hold(s, "interactive", done)) for _ in range(3)]
+        await asyncio.sleep(0)
+        st = s.stats()
+        done.set()
+        await asyncio.gather(*tasks)
+        return st, s
+
+    st, s = asyncio.run(run())
+    assert st["active"]["interactive"] == 2 and st["queued"]["interactive"] == 1
+    assert s.idle() and s.admitted["interactive"] == 3
+
+
+def test_batch_never_takes_the_reserved_slot():
+    async def run():
+        s, done = _scheduler(n=2, reserved=1), asyncio.Event()
+        batch = [asyncio.create_task(_hold(s, "batch", done)) for _ in range(2)]
+        await asyncio.sleep(0)
+        before = s.stats()
+        chat = asyncio.create_task(_hold(s, "interactive", done))
+        await asyncio.sleep(0)
+        after = s.stats()
+        done.set()
+        await asyncio.gather(*batch, chat)
+        return before, after
+
+    before, after = asyncio.run(run())
+    assert before["active"] == {"interactive": 0, "batch": 1}
+    assert before["queued"]["batch"] == 1
+    assert after["active"] == {"interactive": 1, "batch": 1}
+
+
+def test_weighted_round_robin_does_not_starve_batch():
+    async def run():
+        s, order = _scheduler(n=1, reserved=0), []
+        gate = asyncio.Event()
+        first = asyncio.create_task(_hold(s, "interactive", gate))
+        await asyncio.sleep(0)
+        done = asyncio.Event(); done.set()
+        waiters = [asyncio.create_task(_hold(s, p, done, order))
+                   for p in ["batch"] * 2 + ["interactive"] * 8]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *waiters)
+        return order
+
+    order = asyncio.run(run())
+    assert order.count("batch") == 2
+    # 4:1 -> un batch en los primeros cinco turnos
+    assert "batch" in order[:5]
+    assert order[0] == "interactive"
+
+
+def test_full_queue_rejects():
+    async def run():
+        s = _scheduler(n=1, reserved=0, queue_max={"interactive": 1, "batch": 1})
+        done = asyncio.Event()
+        running = asyncio.create_task(_hold(s, "interactive", done))
+        queued = asyncio.create_task(_hold(s, "interactive", done))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull) as exc:
+            async with s.slot("interactive"):
+                pass
+        done.set()
+        await asyncio.gather(running, queued)
+        return s, exc.value
+
+    s, err = asyncio.run(run())
+    assert err.priority == "interactive" and err.retry_after >= 1
+    assert s.rejected["interactive"] == 1
+
+
+def test_cancelled_waiter_frees_its_place():
+    async def run():
+        s, done = _scheduler(n=1, reserved=0), asyncio.Event()
+        running = asyncio.create_task(_hold(s, "interactive", done))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(_hold(s, "interactive", done))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        done.set()
+        await running
+        return s
+
+    s = asyncio.run(run())
+    assert s.idle() and s.stats()["active"] == {"interactive": 0, "batch": 0}
+
+
+def test_priority_context():
+    async def run():
+        s = _scheduler()
+        with llm_priority("batch"):
+            async with s.slot():
+                return s.stats()["active"]
+
+    assert asyncio.run(run()) == {"interactive": 0, "batch": 1}
+    with pytest.raises(ValueError):
+        with llm_priority("urgente"):
+            pass
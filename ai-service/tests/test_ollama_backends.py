@@ -0,0 +1,116 @@
+# ai-service/tests/test_ollama_backends.py
+
+import asyncio
+
+import httpx
+import pytest
+
+import circuit_breaker as cb
+from circuit_breaker import CLOSED, OPEN, CircuitOpen
+from ollama_backends import BackendPool, is_backend_failure
+
+URLS = ["http://ollama-1:11434", "http://ollama-2:11434", "http://ollama-3:11434"]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(cb, "LLM_CB_FAILURES", 2)
+    return BackendPool(URLS)
+
+
+def _fail(pool, url):
+    b = next(b for b in pool.backends if b.url == url)
+    b.breaker.trip("test")
+    return b
+
+
+def _http_error(status):
+    request = httpx.Request("POST", "http://ollama-1:11434/api/chat")
+    return httpx.HTTPStatusError("x", request=request, response=httpx.Response(status, request=request))
+
+
+def test_sticky_sessions_are_stable_and_spread(pool):
+    picks = {sid: pool.pick(f"sesión {sid}").url for sid in range(60)}
+    assert all(pool.pick(f"sesión {sid}").url == url for sid, url in picks.items())
+    assert set(picks.values()) == set(URLS)
+
+
+def test_sticky_session_only_moves_when_its_backend_is_out(pool):
+    sids = [f"s{i}" for i in range(60)]
+    before = {s: pool.pick(s).url for s in sids}
+    out = _fail(pool, URLS[0])
+    after = {s: pool.pick(s).url for s in sids}
+    for s in sids:
+        if before[s] != out.url:
+            assert after[s] == before[s]  # rendezvous: el resto no se mueve
+        else:
+            assert after[s] != out.url
+    out.breaker.reset()
+    assert {s: pool.pick(s).url for s in sids} == before
+
+
+def test_least_outstanding_wins(pool):
+    pool.backends[0].outstanding = 2
+    pool.backends[1].outstanding = 1
+    assert pool.pick().url == URLS[2]
+    pool.backends[2].outstanding = 3
+    assert pool.pick().url == URLS[1]
+    # a igual carga, el que menos peticiones lleva
+    pool.backends[0].outstanding = pool.backends[1].outstanding = 0
+    pool.backends[0].requests, pool.backends[1].requests = 5, 2
+    assert pool.pick().url == URLS[1]
+
+
+def test_use_accounts_outstanding_calls(pool):
+    async def run():
+        async with pool.use() as c1:
+            async with pool.use() as c2:
+                assert c1.url != c2.url
+                assert sum(b.outstanding for b in pool.backends) == 2
+        return [b.outstanding for b in pool.backends], [b.requests for b in pool.backends]
+
+    outstanding, requests = asyncio.run(run())
+    assert outstanding == [0, 0, 0] and sum(requests) == 2
+
+
+def test_backend_failures_open_its_circuit_and_fail_over(pool):
+    async def call(exc):
+        async with pool.use(sticky="s"):
+            raise exc
+
+    first = pool.pick("s")
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            asyncio.run(call(httpx.ConnectError("refused")))
+    assert first.breaker.state == OPEN and first.errors == 2
+    assert pool.pick("s") is not first
+
+
+def test_request_errors_do_not_count_against_the_backend(pool):
+    async def call(exc):
+        async with pool.use():
+            raise exc
+
+    for exc in (ValueError("bad json"), _http_error(400)):
+        with pytest.raises(type(exc)):
+            asyncio.run(call(exc))
+    assert all(b.errors == 0 and b.breaker.state == CLOSED for b in pool.backends)
+    assert is_backend_failure(_http_error(503)) and not is_backend_failure(_http_error(404))
+
+
+def test_exclude_and_has_alternative(pool):
+    used = {URLS[0]}
+    assert pool.pick(exclude=used).url != URLS[0]
+    assert pool.has_alternative(used)
+    _fail(pool, URLS[1]); _fail(pool, URLS[2])
+    assert not pool.has_alternative(used)
+    with pytest.raises(CircuitOpen):
+        pool.pick(exclude=used)
+
+
+def test_all_circuits_open_fails_fast_with_retry_after(pool):
+    for url in URLS:
+        _fail(pool, url)
+    with pytest.raises(CircuitOpen) as exc:
+        pool.pick()
+    assert 1 <= exc.value.retry_after <= cb.LLM_CB_OPEN_SECONDS
@@ -0,0 +1,46 @@
+# ai-service/tests/test_ollama_client.py
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import ollama_client
+from ollama_backends import BACKENDS
+from llm_scheduler import SCHEDULER
+
+
+@pytest.fixture
+def ndjson(monkeypatch):
+    """Cliente httpx contra un Ollama falso que emite 50 tokens en streaming."""
+    state = {"closed": False}
+
+    class Body(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            for i in range(50):
+                yield (json.dumps({"response": f"t{i} ", "message": {"content": f"t{i} "}}) + "\n").encode()
+                await asyncio.sleep(0)
+
+        async def aclose(self):
+            state["closed"] = True
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=Body()))
+    monkeypatch.setattr(ollama_client, "_aclient", httpx.AsyncClient(transport=transport))
+    return state
+
+
+@pytest.mark.parametrize("stream", [
+    lambda: ollama_client.astream_once("hola"),
+    lambda: ollama_client.astream_chat([{"role": "user", "content": "hola"}], session_id="s"),
+], ids=["generate", "chat"])
+def test_aclose_releases_slot_backend_and_response(ndjson, stream):
+    async def run():
+        tokens = stream()
+        assert await tokens.__anext__() == "t0 "
+        assert not SCHEDULER.idle()
+        await tokens.aclose()
+        # sin esperar a otra vuelta del loop ni al GC
+        return SCHEDULER.idle(), sum(b.outstanding for b in BACKENDS.backends), ndjson["closed"]
+
+    assert asyncio.run(run()) == (True, 0, True)
@@ -0,0 +1,70 @@
+# ai-service/tests/test_question_pool.py
+
+import hashlib
+import re
+
+import numpy as np
+import pytest
+
+from question_pool import QuestionPool
+
+
+class BagOfWords:
+    """Encoder de prueba: textos con casi las mismas palabras quedan cerca."""
+
+    def encode(self, texts, normalize_embeddings=True):
+        out = np.zeros((len(texts), 64), np.float32)
+        for i, t in enumerate(texts):
+            for w in re.findall(r"\w+", t.lower()):
+                out[i, int(hashlib.md5(w.encode()).hexdigest(), 16) % 64] += 1
+        return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-9)
+
+
+def _q(text):
+    return {"question": text, "expected": "x"}
+
+
+@pytest.fixture
+def pool(tmp_path):
+    return QuestionPool(str(tmp_path / "pool.db"))
+
+
+def test_exact_repeats_are_stored_once(pool):
+    args = ("interview", "backend", "Senior", "m", "")
+    assert pool.add(*args, [_q("¿Qué es un closure?"), _q("¿qué es  un closure?")]) == 1
+    assert pool.add(*args, [_q("¿Qué es un closure?")]) == 0
+
+
+def test_take_skips_near_duplicates(pool):
+    args = ("interview", "backend", "senior", "m", "")
+    pool.add(*args, [
+        _q("¿Qué es un closure en JavaScript?"),
+        _q("Explica qué es un closure en JavaScript"),
+        _q("¿Cómo funciona el event loop de Node?"),
+        _q("¿Qué índices usarías en PostgreSQL para esta consulta?"),
+    ])
+    for _ in range(5):
+        picked = pool.take(*args, 3, enc=BagOfWords())
+        texts = [q["question"] for q in picked]
+        assert sum("closure" in t for t in texts) == 1
+    # sin encoder solo cuentan los textos exactos
+    assert len(pool.take(*args, 4)) == 4
+    # solo hay tres preguntas distintas: pedir cuatro falla
+    assert pool.take(*args, 4, enc=BagOfWords()) is None
+
+
+def test_take_prefers_least_served(pool):
+    args = ("exam", "backend", "junior", "m", "v1")
+    pool.add(*args, [{"q": f"Pregunta {w}"} for w in ("uno", "dos", "tres", "cuatro")])
+    first = {q["q"] for q in pool.take(*args, 2)}
+    second = {q["q"] for q in pool.take(*args, 2)}
+    assert not first & second
+    assert pool.take(*args[:4], "v2", 1) is None
+    assert pool.hits == 2 and pool.misses == 1
+
+
+def test_prune_drops_exams_of_old_kb_versions(pool):
+    pool.add("exam", "backend", "junior", "m", "v1", [{"q": "uno"}])
+    pool.add("interview", "backend", "junior", "m", "", [_q("dos")])
+    pool.prune("v2")
+    assert pool.stats()["questions"] == {"interview": 1}
@@ -0,0 +1,63 @@
+# ai-service/tests/test_result_cache.py
+
+import asyncio
+
+from result_cache import ResultCache, cache_key
+
+
+def test_cache_key_ignores_whitespace_and_key_order():
+    a = cache_key("exam", {"topic": "Python  básico", "n": 5})
+    b = cache_key("exam", {"n": 5, "topic": " Python básico\n"})
+    assert a == b
+    assert a != cache_key("interview", {"topic": "Python básico", "n": 5})
+    assert a != cache_key("exam", {"topic": "Python básico", "n": 5}, kb_version="v2")
+
+
+def test_memory_lru():
+    c = ResultCache(size=2, db="")
+    c.put("a", {"v": 1}); c.put("b", {"v": 2})
+    assert c.get("a") == {"v": 1}  # "a" pasa a ser el más reciente
+    c.put("c", {"v": 3})
+    assert c.get("b") is None
+    assert c.get("a") == {"v": 1} and c.get("c") == {"v": 3}
+    assert c.evictions["lru"] == 1
+    assert c.hits["memory"] == 3 and c.misses == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("result_cache.time.time", lambda: now[0])
+    c = ResultCache(size=4, ttl=10, db="")
+    c.put("a", {"v": 1})
+    now[0] += 5
+    assert c.get("a") == {"v": 1}
+    now[0] += 6
+    assert c.get("a") is None
+    assert c.evictions["ttl"] == 1
+
+
+def test_sqlite_tier_is_shared_and_promotes(tmp_path):
+    db = str(tmp_path / "gen.db")
+    ResultCache(db=db).put("k", {"exam": ["¿Qué es GIL?"]})
+    other = ResultCache(db=db)  # otro worker, memoria vacía
+    assert other.get("k") == {"exam": ["¿Qué es GIL?"]}
+    assert other.get("k") == {"exam": ["¿Qué es GIL?"]}
+    assert other.hits == {"memory": 1, "sqlite": 1}
+    assert other.stats()["sqlite_size"] == 1
+
+
+def test_sqlite_tier_is_bounded(tmp_path):
+    c = ResultCache(size=0, db=str(tmp_path / "gen.db"), db_max=3)
+    for i in range(5):
+        c.put(f"k{i}", {"i": i})
+    assert c.stats()["sqlite_size"] == 3
+    assert c.get("k0") is None and c.get("k4") == {"i": 4}
+
+
+def test_async_api(tmp_path):
+    async def run(c):
+        await c.aput("k", {"v": 1})
+        return await c.aget("k"), await c.aget("x")
+
+    assert asyncio.run(run(ResultCache(db=""))) == ({"v": 1}, None)
+    assert asyncio.run(run(ResultCache(db=str(tmp_path / "gen.db")))) == ({"v": 1}, None)
@@ -0,0 +1,114 @@
+# ai-service/tests/test_session_store.py
+
+import json
+
+import pytest
+
+import session_store
+from session_store import MemorySessionStore, SQLiteSessionStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_store.time, "time", lambda: now[0])
+    return now
+
+
+def _make(kind, tmp_path, **kw):
+    if kind == "memory":
+        return MemorySessionStore(**kw)
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"), **kw)
+
+
+def _session(text="hola"):
+    return {"system": None, "history": [[text, "respuesta"]]}
+
+
+def _size(session):
+    return len(json.dumps(session, ensure_ascii=False))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def kind(request):
+    return request.param
+
+
+def test_roundtrip_and_counters(kind, tmp_path, clock):
+    s = _make(kind, tmp_path)
+    s.put("a", _session())
+    assert s.get("a") == _session()
+    assert s.get("b") is None
+    assert "a" in s and "b" not in s
+    s.delete("a")
+    assert s.get("a") is None
+    st = s.stats()
+    assert st["backend"] == kind and st["size"] == 0 and st["bytes"] == 0
+    assert st["hits"] == 2 and st["misses"] == 3
+
+
+def test_ttl_counts_from_last_access(kind, tmp_path, clock):
+    s = _make(kind, tmp_path, ttl=10)
+    s.put("a", _session())
+    clock[0] += 8
+    assert s.get("a") is not None  # renueva el acceso
+    clock[0] += 8
+    assert s.get("a") is not None
+    clock[0] += 11
+    assert s.get("a") is None
+    assert s.stats()["evictions"] == {"ttl": 1, "lru": 0, "memory": 0}
+    assert s.stats()["size"] == 0
+
+
+def test_expired_sessions_are_swept_on_put(kind, tmp_path, clock):
+    s = _make(kind, tmp_path, ttl=10)
+    s.put("a", _session()); s.put("b", _session())
+    clock[0] += 11
+    s.put("c", _session())
+    assert s.stats()["size"] == 1
+    assert s.stats()["evictions"]["ttl"] == 2
+
+
+def test_lru_evicts_least_recently_accessed(kind, tmp_path, clock):
+    s = _make(kind, tmp_path, max_sessions=2)
+    s.put("a", _session()); clock[0] += 1
+    s.put("b", _session()); clock[0] += 1
+    s.get("a"); clock[0] += 1
+    s.put("c", _session())
+    assert s.get("b") is None
+    assert s.get("a") is not None and s.get("c") is not None
+    assert s.stats()["evictions"]["lru"] == 1
+
+
+def test_memory_cap_evicts_oldest_but_keeps_the_newest(kind, tmp_path, clock):
+    one = _size(_session("x" * 100))
+    s = _make(kind, tmp_path, max_bytes=2 * one)
+    for sid in "abc":
+        s.put(sid, _session("x" * 100)); clock[0] += 1
+    st = s.stats()
+    assert st["size"] == 2 and st["bytes"] == 2 * one
+    assert st["evictions"]["memory"] == 1
+    assert s.get("a") is None
+    # una sesión mayor que el límite no se expulsa a sí misma
+    s.put("big", _session("x" * 1000))
+    assert s.get("big") is not None and s.stats()["size"] == 1
+
+
+def test_rewrite_updates_the_byte_count(kind, tmp_path, clock):
+    s = _make(kind, tmp_path)
+    s.put("a", _session("corto"))
+    s.put("a", _session("bastante más largo"))
+    assert s.stats()["bytes"] == _size(_session("bastante más largo"))
+    assert s.stats()["size"] == 1
+
+
+def test_put_keeps_a_summary_that_is_further_ahead(kind, tmp_path, clock):
+    s = _make(kind, tmp_path)
+    s.put("a", {"system": None, "history": [["u", "a"]] * 8})
+    stale = json.loads(json.dumps(s.get("a")))  # copia de un turno en curso
+    assert s.fold("a", 0, 4, "resumen")
+    stale["history"].append(["nuevo", "turno"])
+    s.put("a", stale)
+    got = s.get("a")
+    assert got["summary"] == "resumen" and got["summarized"] == 4
+    assert len(got["history"]) == 9
@@ -0,0 +1,77 @@
+# ai-service/tests/test_singleflight.py
+
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    async def run():
+        sf, calls = SingleFlight(), []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"ok": True}
+
+        results = await asyncio.gather(*(sf.do("k", fn) for _ in range(5)))
+        return sf, calls, results
+
+    sf, calls, results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [r for r, _ in results] == [{"ok": True}] * 5
+    assert [shared for _, shared in results] == [False] + [True] * 4
+    assert sf.stats() == {"inflight": 0, "calls": 1, "coalesced": 4, "errors": 0}
+
+
+def test_different_keys_and_finished_calls_are_not_shared():
+    async def run():
+        sf = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0)
+            return 1
+
+        await asyncio.gather(sf.do("a", fn), sf.do("b", fn))
+        await sf.do("a", fn)
+        return sf
+
+    assert asyncio.run(run()).stats()["calls"] == 3
+
+
+def test_errors_reach_every_waiter():
+    async def run():
+        sf = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("ollama caído")
+
+        results = await asyncio.gather(sf.do("k", fn), sf.do("k", fn), return_exceptions=True)
+        return sf, results
+
+    sf, results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert sf.errors == 1 and sf.stats()["inflight"] == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def run():
+        sf = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            return "hecho"
+
+        first = asyncio.create_task(sf.do("k", fn))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(sf.do("k", fn))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == ("hecho", True)